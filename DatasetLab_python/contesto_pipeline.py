@@ -0,0 +1,104 @@
+"""
+================================================================================
+CONTESTO CONDIVISO TRA LE FASI DELLA PIPELINE
+================================================================================
+Quando main.py esegue le fasi nello stesso processo, le tabelle prodotte da
+una fase vengono passate alle successive attraverso un contesto (un dizionario
+percorso file -> DataFrame) invece di essere rilette dal CSV appena scritto.
+
+I file CSV restano comunque scritti su disco: sono gli artefatti durevoli
+della pipeline e servono quando una fase viene eseguita da sola.
+
+Autore: Antonio Di Giorgio
+Data: Giugno 2025
+================================================================================
+"""
+
+import os
+import pandas as pd
+
+from schema import applica_schema, leggi_csv, schema_file
+
+
+# ============================================================================
+# FUNZIONI DI UTILITÀ
+# ============================================================================
+def chiave(path):
+    """
+    Normalizzo un percorso per usarlo come chiave del contesto.
+
+    Args:
+        path (str): Percorso del file
+
+    Returns:
+        str: Percorso assoluto normalizzato
+    """
+    return os.path.normcase(os.path.realpath(path))
+
+
+def come_da_csv(df):
+    """
+    Riproduco sui dati in memoria i tipi che read_csv dedurrebbe dal file.
+
+    Le fasi di pulizia lavorano con colonne testuali (dtype=str): rileggendo
+    il CSV le colonne interamente numeriche diventano int/float. Converto le
+    stesse colonne, così chi consuma la tabella dal contesto vede gli stessi
+    tipi che vedrebbe leggendo il file.
+
+    Args:
+        df (pd.DataFrame): Tabella salvata nel contesto
+
+    Returns:
+        pd.DataFrame: Copia con le colonne numeriche convertite
+    """
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def leggi_tabella(contesto, path, usecols=None):
+    """
+    Leggo una tabella dal contesto se disponibile, altrimenti dal CSV.
+
+    In entrambi i casi le colonne hanno i tipi dichiarati in schema.py; per
+    i file senza schema riproduco i tipi che dedurrebbe read_csv.
+
+    Args:
+        contesto (dict): Contesto condiviso tra le fasi (può essere None)
+        path (str): Percorso del file CSV
+        usecols (list): Colonne da leggere (None = tutte)
+
+    Returns:
+        pd.DataFrame: Tabella richiesta
+    """
+    if contesto is None or chiave(path) not in contesto:
+        return leggi_csv(path, usecols=usecols)
+
+    df = contesto[chiave(path)]
+    if usecols is not None:
+        df = df[[c for c in df.columns if c in usecols]]
+
+    schema = schema_file(path)
+    if schema is None:
+        return come_da_csv(df)
+    return applica_schema(df.reset_index(drop=True), schema)
+
+
+def salva_tabella(contesto, df, path, **kwargs):
+    """
+    Salvo una tabella su CSV e la rendo disponibile alle fasi successive.
+
+    Args:
+        contesto (dict): Contesto condiviso tra le fasi (può essere None)
+        df (pd.DataFrame): Tabella da salvare
+        path (str): Percorso del file CSV
+        **kwargs: Argomenti per DataFrame.to_csv
+    """
+    df.to_csv(path, index=False, **kwargs)
+    if contesto is not None:
+        contesto[chiave(path)] = df
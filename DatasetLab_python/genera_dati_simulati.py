@@ -23,17 +23,20 @@ Data: Giugno 2025
 """
 
 import os
-import math
-import random
 import datetime
-from collections import defaultdict, Counter
+from collections import defaultdict
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
 
 import pandas as pd
 import numpy as np
-from faker import Faker
+import importlib
+import importlib.metadata
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from contesto_pipeline import leggi_tabella, salva_tabella
 
 # ============================================================================
 # CONFIGURAZIONE GLOBALE
@@ -56,6 +59,19 @@ MAX_CLASSI_PER_DOCENTE = 6  # Massimo classi assegnate a un docente
 PESO_MIN_VOTO = 1  # Voto minimo possibile
 PESO_MAX_VOTO = 10  # Voto massimo possibile
 SOFT_FLOOR_VOTO = 3  # Soglia soft per voti molto bassi (riduco probabilità sotto 3)
+STUDENTI_PER_BLOCCO_VOTI = 50000  # Studenti per blocco di voti scritto su voti.csv (limita la RAM)
+
+# Parametri per la generazione parallela
+NUM_PROCESSI = os.cpu_count() or 1  # Processi usati per generare gli shard (1 = tutto nel processo corrente)
+SCUOLE_PER_SHARD = 50  # Scuole per shard: unità di lavoro e di riproducibilità
+RIGHE_PER_BLOCCO_SCRITTURA = 1000000  # Righe per blocco nella scrittura dei file finali
+
+# Cifre minime degli id testuali nei file finali: se i totali generati ne
+# richiedono di più, la larghezza cresce per tutti gli id dello stesso tipo
+CIFRE_ID_CLASSE = 4  # codicescuola_0001
+CIFRE_ID_STUDENTE = 6  # STU000001
+CIFRE_ID_DOCENTE = 5  # DOC00001
+CIFRE_ID_VOTO = 7  # VOT0000001
 
 # Parametri ESCS (Economic, Social and Cultural Status)
 ESCS_MIN = -2.86  # Valore minimo ESCS osservato nei dati reali
@@ -156,6 +172,11 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 INPUT_DIR = os.path.join(BASE_DIR, '../file/dataset_puliti')
 OUTPUT_DIR = os.path.join(BASE_DIR, '../file/dataset_definitivi')
 
+# Cache su disco dei pool di nomi estratti da Faker (uno per locale)
+CACHE_DIR = os.path.join(BASE_DIR, '../file/cache')
+USA_CACHE_NOMI = True  # Se False rileggo sempre i provider di Faker
+VERSIONE_CACHE_NOMI = 1  # Da incrementare se cambia il formato dei file .npz
+
 # Creo la directory di output se non esiste
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -163,69 +184,41 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # INIZIALIZZAZIONE GENERATORI CASUALI
 # ============================================================================
 """
-Inizializzo i generatori di numeri casuali con il seed per garantire
-riproducibilità dei risultati.
+Le scuole sono divise in shard di SCUOLE_PER_SHARD scuole. Ogni shard riceve
+un proprio generatore NumPy, derivato da SEED con np.random.SeedSequence:
+i flussi casuali sono indipendenti tra shard e non dipendono dal numero di
+processi, quindi a parità di SEED l'output è identico con 1 o 32 processi.
+Tutte le funzioni che estraggono valori casuali ricevono il generatore rng.
 """
 
-if SEED is not None:
-    random.seed(SEED)
-    np.random.seed(SEED)
-
-# Inizializzo Faker per generare nomi italiani realistici
-faker = Faker('it_IT')
-if SEED is not None:
-    Faker.seed(SEED)
-
 
 # ============================================================================
 # FUNZIONI DI UTILITÀ GENERALI
 # ============================================================================
-def to_int_safe(x):
+def calcola_escs_quartile(escs: np.ndarray) -> np.ndarray:
     """
-    Converto in intero in modo sicuro gestendo valori non validi.
-
-    Args:
-        x: Valore da convertire
-
-    Returns:
-        int: Valore convertito o 0 se non convertibile
-    """
-    try:
-        return int(x)
-    except:
-        return 0
-
-
-def calcola_escs_quartile(escs: float) -> int:
-    """
-    Calcolo il quartile ESCS di uno studente.
+    Calcolo il quartile ESCS di un insieme di studenti.
 
     Divido l'intervallo ESCS in 4 parti uguali per determinare
-    il quartile di appartenenza.
+    il quartile di appartenenza, con un'unica chiamata a np.digitize.
 
     Args:
-        escs (float): Valore ESCS dello studente
+        escs (np.ndarray): Valori ESCS degli studenti
 
     Returns:
-        int: Quartile (1-4) di appartenenza
+        np.ndarray: Quartile (1-4) di appartenenza di ogni studente
     """
     # Calcolo la posizione percentuale nell'intervallo ESCS
     percentile = (escs - ESCS_MIN) / (ESCS_MAX - ESCS_MIN) * 100
 
-    # Assegno il quartile corrispondente
-    if percentile <= 25:
-        return 1
-    elif percentile <= 50:
-        return 2
-    elif percentile <= 75:
-        return 3
-    else:
-        return 4
+    # Assegno il quartile corrispondente (estremi superiori inclusi)
+    return np.digitize(percentile, [25, 50, 75], right=True) + 1
 
 
-def genera_escs_studente(area_geografica: str, tipo_scuola: str, cittadinanza: str) -> float:
+def genera_escs_studente(area_geografica: np.ndarray, tipo_scuola: np.ndarray,
+                         cittadinanza: np.ndarray, rng: np.random.Generator) -> np.ndarray:
     """
-    Genero un valore ESCS realistico per uno studente.
+    Genero valori ESCS realistici per un insieme di studenti.
 
     L'ESCS è influenzato da:
     - Area geografica (nord più alto, sud più basso)
@@ -233,66 +226,220 @@ def genera_escs_studente(area_geografica: str, tipo_scuola: str, cittadinanza: s
     - Cittadinanza (italiani più alto, stranieri più basso)
 
     Args:
-        area_geografica (str): Area geografica della scuola
-        tipo_scuola (str): Tipo di scuola frequentata
-        cittadinanza (str): Cittadinanza dello studente (ITA/UE/NON_UE)
+        area_geografica (np.ndarray): Area geografica della scuola di ogni studente
+        tipo_scuola (np.ndarray): Tipo di scuola frequentata da ogni studente
+        cittadinanza (np.ndarray): Cittadinanza di ogni studente (ITA/UE/NON_UE)
+        rng (np.random.Generator): Generatore casuale dello shard
 
     Returns:
-        float: Valore ESCS generato
+        np.ndarray: Valori ESCS generati
     """
-    # Parto da una distribuzione normale standard
-    base_escs = np.random.normal(0, 1)
+    # Parto da una distribuzione normale standard, un'estrazione per studente
+    base_escs = rng.normal(0, 1, size=len(cittadinanza))
 
     # Applico modificatori basati sull'area geografica
-    if area_geografica in ['NORD-OVEST', 'NORD-EST']:
-        base_escs += 0.4
-    elif area_geografica in ['SUD', 'ISOLE']:
-        base_escs -= 0.5
+    area = pd.Series(area_geografica)
+    base_escs += np.where(area.isin(['NORD-OVEST', 'NORD-EST']), 0.4,
+                          np.where(area.isin(['SUD', 'ISOLE']), -0.5, 0.0))
 
     # Applico modificatori basati sul tipo di scuola
-    if 'LICEO' in tipo_scuola:
-        base_escs += 0.3
-    elif 'PROFESSIONALE' in tipo_scuola:
-        base_escs -= 0.4
+    tipo = pd.Series(tipo_scuola).fillna('').astype(str)
+    base_escs += np.where(tipo.str.contains('LICEO', regex=False), 0.3,
+                          np.where(tipo.str.contains('PROFESSIONALE', regex=False), -0.4, 0.0))
 
     # Applico modificatori basati sulla cittadinanza
-    if cittadinanza == 'NON_UE':
-        base_escs -= 0.6
-    elif cittadinanza == 'UE':
-        base_escs -= 0.2
+    base_escs += np.select([cittadinanza == 'NON_UE', cittadinanza == 'UE'], [-0.6, -0.2], 0.0)
 
-    # Mi assicuro che il valore sia nell'intervallo valido
+    # Mi assicuro che i valori siano nell'intervallo valido
     return np.clip(base_escs, ESCS_MIN, ESCS_MAX)
 
 
-def estrai_provincia_da_codice(codice_scuola: str) -> str:
+def estrai_provincia_da_codice(codici_scuola: pd.Series) -> pd.Series:
     """
-    Estraggo la provincia dal codice meccanografico della scuola.
+    Estraggo la provincia dal codice meccanografico delle scuole.
 
     I primi due caratteri del codice indicano la provincia.
 
     Args:
-        codice_scuola (str): Codice meccanografico della scuola
+        codici_scuola (pd.Series): Codici meccanografici delle scuole
 
     Returns:
-        str: Sigla della provincia (es. 'MI', 'RM')
+        pd.Series: Sigle delle province (es. 'MI', 'RM')
     """
-    if len(codice_scuola) >= 2:
-        return codice_scuola[:2].upper()
-    return 'RM'  # Default Roma se non riesco a estrarre
+    codici = codici_scuola.astype(str)
+    # Default Roma se non riesco a estrarre
+    return codici.str[:2].str.upper().where(codici.str.len() >= 2, 'RM')
 
 
-def get_area_geografica(provincia: str) -> str:
+def get_area_geografica(province: pd.Series) -> pd.Series:
     """
-    Ottengo l'area geografica dalla provincia.
+    Ottengo l'area geografica dalle province con un join su PROVINCE_TO_AREA.
 
     Args:
-        provincia (str): Sigla della provincia
+        province (pd.Series): Sigle delle province
 
     Returns:
-        str: Area geografica corrispondente
+        pd.Series: Aree geografiche corrispondenti
     """
-    return PROVINCE_TO_AREA.get(provincia, 'CENTRO')
+    return province.map(PROVINCE_TO_AREA).fillna('CENTRO')
+
+
+# ============================================================================
+# POOL DI NOMI
+# ============================================================================
+"""
+Estraggo una sola volta gli elenchi di nomi e cognomi dai provider di Faker
+e li tengo in array NumPy: i nomi vengono poi campionati per indice, in
+blocco, con il generatore dello shard (quindi riproducibili con SEED).
+"""
+
+FAKER_LOCALE = 'it_IT'  # Locale dei nomi per studenti italiani e docenti
+
+# Nomi stranieri comuni per maggiore realismo
+NOMI_STRANIERI_M = ['Mohamed', 'Alexandru', 'Ahmed', 'Andrei', 'Carlos', 'Ivan', 'Youssef']
+NOMI_STRANIERI_F = ['Fatima', 'Maria', 'Elena', 'Sara', 'Ana', 'Amina', 'Sofia']
+COGNOMI_STRANIERI = ['Singh', 'Kumar', 'Hassan', 'Ali', 'Rodriguez', 'Popescu', 'Ivanov']
+
+
+@dataclass
+class ElencoNomi:
+    """
+    Elenco di nomi campionabile per indice.
+
+    Se il provider di Faker associa dei pesi ai nomi, tengo la loro
+    distribuzione cumulata; altrimenti il campionamento è uniforme.
+    """
+    valori: np.ndarray
+    cumulata: Optional[np.ndarray] = None
+
+    def campiona(self, k: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Estraggo k nomi con un'unica chiamata al generatore.
+
+        Args:
+            k (int): Numero di nomi da estrarre
+            rng (np.random.Generator): Generatore casuale dello shard
+
+        Returns:
+            np.ndarray: Nomi estratti
+        """
+        if self.cumulata is None:
+            return self.valori[rng.integers(0, len(self.valori), size=k)]
+        return self.valori[np.searchsorted(self.cumulata, rng.random(k) * self.cumulata[-1], side='right')]
+
+
+def elenco_da_provider(elenco) -> ElencoNomi:
+    """
+    Converto un elenco del provider di Faker (tupla o dizionario pesato).
+
+    Args:
+        elenco: Tupla di nomi o dizionario nome -> peso
+
+    Returns:
+        ElencoNomi: Elenco pronto per il campionamento
+    """
+    if isinstance(elenco, dict):
+        return ElencoNomi(np.array(list(elenco.keys())), np.cumsum(list(elenco.values()), dtype=float))
+    return ElencoNomi(np.array(elenco))
+
+
+def carica_pool_nomi(locale: str) -> Dict[str, ElencoNomi]:
+    """
+    Carico i pool di nomi e cognomi per un locale di Faker.
+
+    Uso la cache su disco (file .npz per locale) quando disponibile;
+    altrimenti leggo il provider person di Faker e salvo la cache. Il nome
+    del file contiene la versione di Faker e quella del formato: se una
+    delle due cambia la voce non viene trovata e ricostruisco il pool.
+
+    Args:
+        locale (str): Locale di Faker (es. 'it_IT')
+
+    Returns:
+        Dict[str, ElencoNomi]: Elenchi 'nomi_m', 'nomi_f', 'nomi' e 'cognomi'
+    """
+    chiavi = {'nomi_m': 'first_names_male', 'nomi_f': 'first_names_female',
+              'nomi': 'first_names', 'cognomi': 'last_names'}
+    # Leggo la versione dai metadati del pacchetto (è la stessa di
+    # faker.VERSION) per non importare Faker a cache calda
+    versione_faker = importlib.metadata.version('faker')
+    prefisso = f'nomi_{locale}__'
+    path_cache = os.path.join(CACHE_DIR, f'{prefisso}faker{versione_faker}_v{VERSIONE_CACHE_NOMI}.npz')
+
+    if USA_CACHE_NOMI and os.path.exists(path_cache):
+        try:
+            with np.load(path_cache) as dati:
+                return {
+                    k: ElencoNomi(dati[k], dati[f'{k}_cumulata'] if f'{k}_cumulata' in dati else None)
+                    for k in chiavi
+                }
+        except (OSError, ValueError, KeyError):
+            pass  # Voce illeggibile o incompleta: la ricostruisco
+
+    # Importo il provider solo quando serve: a cache calda Faker non viene caricato
+    provider = importlib.import_module(f'faker.providers.person.{locale}').Provider
+    pool = {k: elenco_da_provider(getattr(provider, attr)) for k, attr in chiavi.items()}
+
+    if USA_CACHE_NOMI:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        arrays = {k: e.valori for k, e in pool.items()}
+        arrays.update({f'{k}_cumulata': e.cumulata for k, e in pool.items() if e.cumulata is not None})
+        # Scrivo su un file temporaneo: i processi degli shard possono
+        # ricostruire la stessa voce in contemporanea
+        temporaneo = f'{path_cache}.{os.getpid()}.tmp'
+        with open(temporaneo, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporaneo, path_cache)
+
+        # Elimino le voci dello stesso locale create con altre versioni
+        # (compresa quella senza versione nel nome, nomi_<locale>.npz)
+        for nome in os.listdir(CACHE_DIR):
+            completo = os.path.join(CACHE_DIR, nome)
+            obsoleta = nome.startswith(prefisso) or nome == f'nomi_{locale}.npz'
+            if obsoleta and nome.endswith('.npz') and completo != path_cache:
+                try:
+                    os.remove(completo)
+                except FileNotFoundError:
+                    pass
+
+    return pool
+
+
+POOL_NOMI = carica_pool_nomi(FAKER_LOCALE)
+POOL_STRANIERI = {
+    'nomi_m': ElencoNomi(np.array(NOMI_STRANIERI_M)),
+    'nomi_f': ElencoNomi(np.array(NOMI_STRANIERI_F)),
+    'cognomi': ElencoNomi(np.array(COGNOMI_STRANIERI))
+}
+
+
+def campiona_nomi_studenti(sesso: np.ndarray, citt: np.ndarray,
+                           rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Genero nomi e cognomi di tutti gli studenti in blocco.
+
+    Gli studenti italiani ricevono nomi del locale di Faker coerenti con il
+    sesso; gli stranieri nomi e cognomi stranieri comuni.
+
+    Args:
+        sesso (np.ndarray): 'M' o 'F' per ogni studente
+        citt (np.ndarray): Cittadinanza di ogni studente (ITA/UE/NON_UE)
+        rng (np.random.Generator): Generatore casuale dello shard
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Nomi e cognomi
+    """
+    nomi = np.empty(len(sesso), dtype=object)
+    cognomi = np.empty(len(sesso), dtype=object)
+    ita = citt == 'ITA'
+    maschio = sesso == 'M'
+
+    for pool, gruppo in ((POOL_NOMI, ita), (POOL_STRANIERI, ~ita)):
+        for chiave, mask in (('nomi_m', gruppo & maschio), ('nomi_f', gruppo & ~maschio)):
+            nomi[mask] = pool[chiave].campiona(int(mask.sum()), rng)
+        cognomi[gruppo] = pool['cognomi'].campiona(int(gruppo.sum()), rng)
+
+    return nomi, cognomi
 
 
 # ============================================================================
@@ -483,6 +630,84 @@ def tipologia_delta(materia, tipologia):
     return TIPOLOGIA_ADJUST.get(tipologia, {}).get(cat, 0.0)
 
 
+def ordina_tipologie(materia: str) -> List[str]:
+    """
+    Ordino le tipologie di voto di una materia per peso decrescente.
+
+    Args:
+        materia (str): Nome della materia
+
+    Returns:
+        List[str]: Tipologie dalla più alla meno rilevante
+    """
+    # Recupero i pesi per questa materia
+    pesi = TIPOLOGIA_PESI.get(materia.upper(), TIPOLOGIE_DEFAULT)
+    return [t for t, _ in sorted(pesi.items(), key=lambda x: x[1], reverse=True)]
+
+
+# ============================================================================
+# CATALOGO DELLE MATERIE
+# ============================================================================
+"""
+Compilo una sola volta, all'avvio, il catalogo di tutte le materie dei
+curricula: ogni materia riceve un id intero e le sue proprietà (difficoltà,
+aggiustamenti e ordine delle tipologie) diventano array indicizzati per id. Le fasi successive lavorano su array di id invece di richiamare
+categoria_materia e ordina_tipologie per ogni classe o voto.
+"""
+
+
+@dataclass
+class CatalogoMaterie:
+    """
+    Proprietà precalcolate delle materie, indicizzate per id intero.
+    """
+    nomi: np.ndarray  # object (materie): nome come compare nei curricula
+    titoli: np.ndarray  # object (materie): nome nel formato dei file di output
+    indice: pd.Index  # MATERIA in maiuscolo -> id
+    difficolta: np.ndarray  # float (materie): impatto sul voto medio
+    delta_tipologia: np.ndarray  # float (materie, tipologie): tipologia_delta
+    ordine_tipologie: np.ndarray  # int8 (materie, tipologie): tipologie per peso decrescente
+
+    def __len__(self) -> int:
+        return len(self.nomi)
+
+
+def costruisci_catalogo() -> CatalogoMaterie:
+    """
+    Costruisco il catalogo con tutte le materie che compaiono nei curricula.
+
+    Le materie sono numerate nell'ordine in cui compaiono nella
+    configurazione, senza duplicati (il confronto è in maiuscolo).
+
+    Returns:
+        CatalogoMaterie: Catalogo delle materie
+    """
+    tutte = MATERIE_BASE_COMUNI_BIENNIO + MATERIE_BASE_COMUNI_TRIENNIO + FALLBACK_MATERIE
+    for indir_map in MATERIE_INDIRIZZO.values():
+        for mats in indir_map.values():
+            tutte += [m.replace(' (Inizio 2 anno)', '') for m in mats]
+
+    nomi = {}
+    for m in tutte:
+        nomi.setdefault(m.upper(), m)
+
+    return CatalogoMaterie(
+        nomi=np.array(list(nomi.values()), dtype=object),
+        titoli=np.array([m.title() for m in nomi], dtype=object),
+        indice=pd.Index(list(nomi)),
+        difficolta=np.array([MATERIA_DIFFICOLTA[m] for m in nomi]),
+        delta_tipologia=np.array(
+            [[tipologia_delta(m, t) for t in TIPOLOGIE_ORDINE] for m in nomi]
+        ).reshape(-1, len(TIPOLOGIE_ORDINE)),
+        ordine_tipologie=np.array(
+            [[TIPOLOGIE_ORDINE.index(t) for t in ordina_tipologie(m)] for m in nomi], dtype=np.int8
+        ).reshape(-1, len(TIPOLOGIE_ORDINE))
+    )
+
+
+CATALOGO = costruisci_catalogo()
+
+
 # ============================================================================
 # CARICAMENTO DATI DI INPUT
 # ============================================================================
@@ -490,31 +715,39 @@ def tipologia_delta(materia, tipologia):
 Carico i file prodotti dalle fasi precedenti della pipeline.
 """
 
-print('Caricamento CSV di input...')
 
-# Anagrafica scuole con informazioni geografiche
-df_anag = pd.read_csv(os.path.join(INPUT_DIR, 'anagrafica_scuole_pulita.csv'))
-
-# Studenti per indirizzo con distribuzione di genere
-df_ind = pd.read_csv(os.path.join(INPUT_DIR, 'stu_indirizzi_pulito.csv'))
+def carica_input(contesto: Optional[dict] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Carico gli studenti per indirizzo e le statistiche per scuola.
 
-# Statistiche calcolate nella fase precedente
-df_stats = pd.read_csv(os.path.join(INPUT_DIR, 'statistiche_base.csv'))
+    Args:
+        contesto (dict): Tabelle condivise tra le fasi eseguite nello stesso
+            processo (None quando lo script è eseguito da solo)
 
-# Converto i campi numerici in modo sicuro
-for col in ['alunnimaschi', 'alunnifemmine']:
-    if col in df_ind.columns:
-        df_ind[col] = df_ind[col].map(to_int_safe)
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: df_ind e df_stats pronti per la generazione
+    """
+    # Studenti per indirizzo con distribuzione di genere: i conteggi arrivano
+    # già interi dallo schema dei file (schema.py)
+    df_ind = leggi_tabella(contesto, os.path.join(INPUT_DIR, 'stu_indirizzi_pulito.csv'))
+
+    # Statistiche calcolate nella fase precedente (servono solo le percentuali)
+    df_stats = leggi_tabella(contesto, os.path.join(INPUT_DIR, 'statistiche_base.csv'), usecols=[
+        'codicescuola', 'perc_maschi', 'perc_femmine', 'perc_italiani', 'perc_stranieri'
+    ])
+
+    # Calcolo il totale studenti se non presente
+    if 'totale' not in df_ind.columns:
+        df_ind['totale'] = df_ind['alunnimaschi'] + df_ind['alunnifemmine']
+
+    # Normalizzo i nomi degli indirizzi per confronti consistenti
+    if 'indirizzo' in df_ind.columns:
+        df_ind['indirizzo_norm'] = df_ind['indirizzo'].str.upper().str.strip()
+    else:
+        raise ValueError('Colonna indirizzo mancante in stu_indirizzi_pulito.csv')
 
-# Calcolo il totale studenti se non presente
-if 'totale' not in df_ind.columns:
-    df_ind['totale'] = df_ind['alunnimaschi'] + df_ind['alunnifemmine']
+    return df_ind, df_stats
 
-# Normalizzo i nomi degli indirizzi per confronti consistenti
-if 'indirizzo' in df_ind.columns:
-    df_ind['indirizzo_norm'] = df_ind['indirizzo'].str.upper().str.strip()
-else:
-    raise ValueError('Colonna indirizzo mancante in stu_indirizzi_pulito.csv')
 
 # ============================================================================
 # FASE 1: GENERAZIONE CLASSI
@@ -524,101 +757,104 @@ Genero le classi per ogni scuola basandomi sul numero di studenti
 per indirizzo e anno di corso.
 """
 
-print('Generazione classi...')
+lettere_disponibili = np.array([chr(i) for i in range(ord('A'), ord('Z') + 1)])
 
-# Strutture dati per la generazione
-classi_generate = []
-class_counter_per_school = {}  # Contatore progressivo per ID univoci
-lettere_classi = defaultdict(lambda: defaultdict(int))  # Per assegnare lettere alle classi
-lettere_disponibili = [chr(i) for i in range(ord('A'), ord('Z') + 1)]
 
-# Itero su ogni combinazione scuola-indirizzo-anno
-for _, row in df_ind.iterrows():
-    codice_scuola = row['codicescuola']
-    indirizzo_norm = row['indirizzo_norm']
-    indirizzo_orig = row['indirizzo']
-    annocorso = to_int_safe(row['annocorso'])
-    totale = to_int_safe(row['totale'])
+def genera_classi(df_ind: pd.DataFrame, df_stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Genero tutte le classi con operazioni colonnari, senza iterare sulle righe.
 
-    # Skip se non ci sono studenti
-    if totale <= 0:
-        continue
+    Ogni riga (codicescuola, indirizzo, annocorso) viene espansa nelle sue
+    classi con np.repeat; contatori e lettere nascono da cumcount per scuola
+    e per (scuola, anno). Le statistiche della scuola arrivano con un join
+    sulla prima riga per codicescuola di statistiche_base.csv, che ha più
+    righe per scuola a causa del merge per tipopercorso.
 
-    # Recupero le statistiche della scuola
-    stats_row = df_stats[df_stats['codicescuola'] == codice_scuola].head(1)
-    if stats_row.empty:
-        continue
+    Gli id_classe sono interi progressivi locali allo shard; la colonna
+    progressivo conserva il contatore per scuola da cui l'unione finale
+    ricava la forma testuale codicescuola_nnnn.
 
-    # Estraggo le percentuali per generare distribuzioni realistiche
-    perc_maschi = float(stats_row['perc_maschi'].values[0])
-    perc_femmine = float(stats_row['perc_femmine'].values[0])
-    perc_italiani = float(stats_row['perc_italiani'].values[0])
-    perc_stranieri = float(stats_row['perc_stranieri'].values[0])
+    Args:
+        df_ind (pd.DataFrame): Studenti per indirizzo e anno di corso
+        df_stats (pd.DataFrame): Statistiche di base per scuola
 
-    # Calcolo il numero di classi necessarie
-    num_classi = math.ceil(totale / MEDIA_ALUNNI_PER_CLASSE)
+    Returns:
+        pd.DataFrame: Una riga per classe generata
+    """
+    righe = df_ind[['codicescuola', 'indirizzo', 'indirizzo_norm']].copy()
+    righe['annocorso'] = pd.to_numeric(df_ind['annocorso'], errors='coerce').fillna(0).astype(int)
+    righe['totale'] = pd.to_numeric(df_ind['totale'], errors='coerce').fillna(0).astype(int)
 
-    # Distribuisco gli studenti tra le classi in modo equilibrato
-    studenti_per_classe = [totale // num_classi] * num_classi
-    # Distribuisco gli studenti rimanenti
-    for i in range(totale % num_classi):
-        studenti_per_classe[i] += 1
+    # Skip se non ci sono studenti
+    righe = righe[righe['totale'] > 0]
+
+    # Recupero le statistiche della scuola (scarto le scuole senza statistiche)
+    stats = df_stats.drop_duplicates(subset=['codicescuola'], keep='first')[
+        ['codicescuola', 'perc_maschi', 'perc_femmine', 'perc_italiani', 'perc_stranieri']
+    ]
+    righe = righe.merge(stats, on='codicescuola', how='inner')
+
+    # statistiche_base.csv nasce da merge left: una scuola senza dati di genere
+    # o di cittadinanza può avere percentuali mancanti, che convertite in
+    # interi darebbero classi di dimensioni senza senso. Scarto queste scuole
+    # e lo segnalo
+    mancanti = righe[['perc_maschi', 'perc_italiani']].isna().any(axis=1)
+    if mancanti.any():
+        scartate = pd.unique(righe.loc[mancanti, 'codicescuola'])
+        print(f"⚠️ {len(scartate)} scuole senza percentuali di genere o cittadinanza escluse "
+              f"dalla generazione: {', '.join(map(str, scartate[:10]))}{' ...' if len(scartate) > 10 else ''}")
+        righe = righe[~mancanti]
 
     # Determino l'area geografica dalla provincia
-    provincia = estrai_provincia_da_codice(codice_scuola)
-    area_geografica = get_area_geografica(provincia)
-
-    # Genero ogni classe
-    for num_studenti in studenti_per_classe:
-        # Incremento il contatore per ID univoco
-        class_counter_per_school.setdefault(codice_scuola, 0)
-        class_counter_per_school[codice_scuola] += 1
-
-        # Assegno la lettera alla classe (1A, 1B, 2A, ecc.)
-        lettere_classi[codice_scuola][annocorso] += 1
-        idx = lettere_classi[codice_scuola][annocorso] - 1
-        if idx >= len(lettere_disponibili):
-            idx = idx % len(lettere_disponibili)
-        nome_classe = f"{annocorso}{lettere_disponibili[idx]}"
-
-        # Genero ID univoco per la classe
-        id_classe = f"{codice_scuola}_{class_counter_per_school[codice_scuola]:04d}"
-
-        # Calcolo la distribuzione di genere nella classe
-        num_maschi = round(num_studenti * perc_maschi)
-        num_femmine = num_studenti - num_maschi
-
-        # Calcolo la distribuzione di cittadinanza
-        num_italiani = round(num_studenti * perc_italiani)
-        num_stranieri = num_studenti - num_italiani
-
-        # Suddivido gli stranieri tra UE e non-UE (stima 30% UE, 70% non-UE)
-        num_stranieri_ue = round(num_stranieri * 0.3)
-        num_stranieri_non_ue = num_stranieri - num_stranieri_ue
-
-        # Aggiungo la classe generata
-        classi_generate.append({
-            'id_classe': id_classe,
-            'codicescuola': codice_scuola,
-            'indirizzo': indirizzo_orig,
-            'indirizzo_norm': indirizzo_norm,
-            'annocorso': annocorso,
-            'nome_classe': nome_classe,
-            'num_studenti': num_studenti,
-            'num_maschi': num_maschi,
-            'num_femmine': num_femmine,
-            'num_italiani': num_italiani,
-            'num_stranieri': num_stranieri,
-            'num_stranieri_ue': num_stranieri_ue,
-            'num_stranieri_non_ue': num_stranieri_non_ue,
-            'provincia': provincia,
-            'area_geografica': area_geografica
-        })
-
-# Salvo le classi generate
-df_classi = pd.DataFrame(classi_generate)
-df_classi.to_csv(os.path.join(OUTPUT_DIR, 'classi.csv'), index=False)
-print(f"Classi generate: {len(df_classi)}")
+    righe['provincia'] = estrai_provincia_da_codice(righe['codicescuola'])
+    righe['area_geografica'] = get_area_geografica(righe['provincia'])
+
+    # Calcolo il numero di classi necessarie
+    totale = righe['totale'].to_numpy()
+    num_classi = -(-totale // MEDIA_ALUNNI_PER_CLASSE)
+
+    # Espando ogni riga nelle sue classi
+    classi = righe.loc[righe.index.repeat(num_classi)].reset_index(drop=True)
+    totale_c = np.repeat(totale, num_classi)
+    num_classi_c = np.repeat(num_classi, num_classi)
+    posizione = np.arange(len(classi)) - np.repeat(np.cumsum(num_classi) - num_classi, num_classi)
+
+    # Distribuisco gli studenti in modo equilibrato: le prime (totale % num_classi)
+    # classi ricevono uno studente in più
+    num_studenti = totale_c // num_classi_c + (posizione < totale_c % num_classi_c)
+
+    # Contatore progressivo per scuola e lettera per (scuola, anno): 1A, 1B, 2A...
+    contatore = classi.groupby('codicescuola', sort=False).cumcount().to_numpy() + 1
+    idx_lettera = classi.groupby(['codicescuola', 'annocorso'], sort=False).cumcount().to_numpy()
+    lettere = lettere_disponibili[idx_lettera % len(lettere_disponibili)]
+
+    # Distribuzione di genere e cittadinanza nella classe
+    num_maschi = np.rint(num_studenti * classi['perc_maschi'].to_numpy()).astype(int)
+    num_italiani = np.rint(num_studenti * classi['perc_italiani'].to_numpy()).astype(int)
+    num_stranieri = num_studenti - num_italiani
+
+    # Suddivido gli stranieri tra UE e non-UE (stima 30% UE, 70% non-UE)
+    num_stranieri_ue = np.rint(num_stranieri * 0.3).astype(int)
+
+    return pd.DataFrame({
+        'id_classe': np.arange(1, len(classi) + 1),
+        'codicescuola': classi['codicescuola'],
+        'indirizzo': classi['indirizzo'],
+        'indirizzo_norm': classi['indirizzo_norm'],
+        'annocorso': classi['annocorso'],
+        'nome_classe': classi['annocorso'].astype(str) + lettere,
+        'num_studenti': num_studenti,
+        'num_maschi': num_maschi,
+        'num_femmine': num_studenti - num_maschi,
+        'num_italiani': num_italiani,
+        'num_stranieri': num_stranieri,
+        'num_stranieri_ue': num_stranieri_ue,
+        'num_stranieri_non_ue': num_stranieri - num_stranieri_ue,
+        'provincia': classi['provincia'],
+        'area_geografica': classi['area_geografica'],
+        'progressivo': contatore
+    })
+
 
 # ============================================================================
 # FASE 2: GENERAZIONE STUDENTI
@@ -628,91 +864,64 @@ Genero gli studenti per ogni classe rispettando le distribuzioni
 di genere, cittadinanza e caratteristiche socio-economiche.
 """
 
-print('Generazione studenti con fattori socio-demografici...')
-
-studenti = []
-studente_counter = 1
-
-# Dizionario per memorizzare i dati socio-demografici per uso futuro
-studenti_socio_demo = {}
-
-# Genero studenti per ogni classe
-for _, row in df_classi.iterrows():
-    id_classe = row['id_classe']
-    num_studenti = int(row['num_studenti'])
-    num_maschi = int(row['num_maschi'])
-    num_femmine = int(row['num_femmine'])
-    num_italiani = int(row['num_italiani'])
-    num_stranieri_ue = int(row['num_stranieri_ue'])
-    num_stranieri_non_ue = int(row['num_stranieri_non_ue'])
-    area_geografica = row['area_geografica']
-    indirizzo_norm = row['indirizzo_norm']
-
-    # Creo le liste di caratteristiche da assegnare
-    sesso_lista = ['M'] * num_maschi + ['F'] * num_femmine
-    citt_lista = ['ITA'] * num_italiani + ['UE'] * num_stranieri_ue + ['NON_UE'] * num_stranieri_non_ue
-
-    # Gestisco eventuali discrepanze di arrotondamento
-    while len(sesso_lista) < num_studenti:
-        sesso_lista.append(random.choice(['M', 'F']))
-    while len(citt_lista) < num_studenti:
-        citt_lista.append(random.choice(['ITA', 'UE', 'NON_UE']))
-
-    # Randomizzo per evitare raggruppamenti artificiali
-    random.shuffle(sesso_lista)
-    random.shuffle(citt_lista)
-
-    # Genero ogni studente della classe
-    for i in range(num_studenti):
-        sesso = sesso_lista[i]
-        citt = citt_lista[i]
-
-        # Genero nome e cognome appropriati alla cittadinanza
-        if citt == 'ITA':
-            nome = faker.first_name_male() if sesso == 'M' else faker.first_name_female()
-            cognome = faker.last_name()
-        else:
-            # Uso nomi stranieri comuni per maggiore realismo
-            nomi_stranieri_m = ['Mohamed', 'Alexandru', 'Ahmed', 'Andrei', 'Carlos', 'Ivan', 'Youssef']
-            nomi_stranieri_f = ['Fatima', 'Maria', 'Elena', 'Sara', 'Ana', 'Amina', 'Sofia']
-            cognomi_stranieri = ['Singh', 'Kumar', 'Hassan', 'Ali', 'Rodriguez', 'Popescu', 'Ivanov']
-
-            nome = random.choice(nomi_stranieri_m if sesso == 'M' else nomi_stranieri_f)
-            cognome = random.choice(cognomi_stranieri)
-
-        # Genero ID univoco studente
-        id_studente = f"STU{studente_counter:06d}"
-        studente_counter += 1
-
-        # Genero il valore ESCS basato sui fattori socio-demografici
-        escs = genera_escs_studente(area_geografica, indirizzo_norm, citt)
-        escs_quartile = calcola_escs_quartile(escs)
-
-        # Aggiungo lo studente
-        studenti.append({
-            'id_studente': id_studente,
-            'id_classe': id_classe,
-            'nome': nome,
-            'cognome': cognome,
-            'sesso': sesso,
-            'cittadinanza': citt,
-            'escs': round(escs, 3),
-            'escs_quartile': escs_quartile
-        })
-
-        # Memorizzo i dati socio-demografici per l'uso nella generazione voti
-        studenti_socio_demo[id_studente] = {
-            'area_geografica': area_geografica,
-            'tipo_scuola': indirizzo_norm,
-            'cittadinanza': citt,
-            'escs': escs,
-            'escs_quartile': escs_quartile
-        }
-
-# Salvo gli studenti generati
-df_studenti = pd.DataFrame(studenti)
-df_studenti.to_csv(os.path.join(OUTPUT_DIR, 'studenti.csv'), index=False)
-print(f"Studenti generati: {len(df_studenti)}")
+
+def genera_studenti(df_classi: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Genero gli studenti di tutte le classi in blocco.
+
+    Per ogni classe costruisco le sequenze di sesso e cittadinanza con i
+    conteggi previsti e le permuto all'interno della classe ordinando su
+    una chiave casuale; ESCS e quartili sono calcolati su array.
+
+    Gli id_studente sono interi progressivi locali allo shard: la forma
+    STUxxxxxx viene assegnata solo nell'unione finale degli shard.
+
+    Args:
+        df_classi (pd.DataFrame): Classi generate nella fase precedente
+        rng (np.random.Generator): Generatore casuale dello shard
+
+    Returns:
+        pd.DataFrame: Una riga per studente (schema di studenti.csv)
+    """
+    num_studenti = df_classi['num_studenti'].to_numpy(dtype=int)
+    n_tot = int(num_studenti.sum())
+
+    # Classe di appartenenza e posizione di ogni studente nella sua classe
+    idx_classe = np.repeat(np.arange(len(df_classi)), num_studenti)
+    posizione = np.arange(n_tot) - np.repeat(np.cumsum(num_studenti) - num_studenti, num_studenti)
+
+    def per_studente(col):
+        return np.repeat(df_classi[col].to_numpy(), num_studenti)
+
+    # Sequenze ordinate: prima i maschi poi le femmine; ITA, UE, NON_UE
+    soglia_m = per_studente('num_maschi')
+    soglia_ita = per_studente('num_italiani')
+    soglia_ue = soglia_ita + per_studente('num_stranieri_ue')
+    sesso = np.where(posizione < soglia_m, 'M', 'F')
+    citt = np.select([posizione < soglia_ita, posizione < soglia_ue], ['ITA', 'UE'], 'NON_UE')
+
+    # Randomizzo per evitare raggruppamenti artificiali (permutazioni indipendenti per classe)
+    sesso = sesso[np.lexsort((rng.random(n_tot), idx_classe))]
+    citt = citt[np.lexsort((rng.random(n_tot), idx_classe))]
+
+    # Genero il valore ESCS basato sui fattori socio-demografici
+    escs = genera_escs_studente(per_studente('area_geografica'), per_studente('indirizzo_norm'), citt, rng)
+    escs_quartile = calcola_escs_quartile(escs)
+
+    # Genero nome e cognome appropriati alla cittadinanza
+    nomi, cognomi = campiona_nomi_studenti(sesso, citt, rng)
+
+    return pd.DataFrame({
+        'id_studente': np.arange(1, n_tot + 1),
+        'id_classe': per_studente('id_classe'),
+        'nome': nomi,
+        'cognome': cognomi,
+        'sesso': sesso,
+        'cittadinanza': citt,
+        'escs': np.round(escs, 3),
+        'escs_quartile': escs_quartile
+    })
+
 
 # ============================================================================
 # FASE 3: ASSEGNAZIONE MATERIE ALLE CLASSI
@@ -722,8 +931,6 @@ Determino quali materie sono insegnate in ogni classe basandomi
 sull'indirizzo di studio e l'anno di corso.
 """
 
-print('Assegnazione materie alle classi...')
-
 
 def materie_per_classe(indirizzo_norm: str, anno: int) -> List[str]:
     """
@@ -769,120 +976,162 @@ def materie_per_classe(indirizzo_norm: str, anno: int) -> List[str]:
     return res
 
 
-# Genero il mapping classe -> materie
-materie_classe = {}
-for _, row in df_classi.iterrows():
-    materie_classe[row['id_classe']] = materie_per_classe(
-        row['indirizzo_norm'],
-        int(row['annocorso'])
-    )
+@lru_cache(maxsize=None)
+def curriculum(indirizzo_norm: str, anno: int) -> np.ndarray:
+    """
+    Restituisco gli id di catalogo delle materie di una classe.
+
+    Il risultato è memorizzato per (indirizzo_norm, anno): i curricula
+    distinti sono pochi (indirizzi per anni di corso) e vengono costruiti
+    una volta sola.
+
+    Args:
+        indirizzo_norm (str): Tipo di scuola normalizzato
+        anno (int): Anno di corso (1-5)
+
+    Returns:
+        np.ndarray: Id delle materie, nell'ordine di materie_per_classe
+    """
+    ids = CATALOGO.indice.get_indexer([m.upper() for m in materie_per_classe(indirizzo_norm, anno)])
+    ids = ids.astype(np.int16)
+    ids.flags.writeable = False
+    return ids
+
+
+def mappa_materie_classi(df_classi: pd.DataFrame) -> pd.DataFrame:
+    """
+    Genero le coppie classe-materia senza iterare sulle righe.
+
+    Ogni classe riceve il curriculum della sua combinazione (indirizzo_norm,
+    annocorso): le combinazioni distinte sono fattorizzate e i loro curricula
+    concatenati vengono espansi sulle classi con np.repeat.
+
+    Args:
+        df_classi (pd.DataFrame): Classi generate
+
+    Returns:
+        pd.DataFrame: Una riga per ogni materia insegnata in ogni classe
+            (id_classe, codicescuola, id_materia), nell'ordine delle classi
+            e dei curricula
+    """
+    # Fattorizzo le combinazioni (indirizzo_norm, annocorso)
+    cod_ind, indirizzi = pd.factorize(df_classi['indirizzo_norm'], use_na_sentinel=False)
+    cod_anno, anni = pd.factorize(df_classi['annocorso'].astype(int))
+    codici, combinazioni = pd.factorize(cod_ind * len(anni) + cod_anno)
+
+    curricula = [curriculum(indirizzi[c // len(anni)], int(anni[c % len(anni)])) for c in combinazioni]
+    lunghezze = np.array([len(c) for c in curricula], dtype=int)
+    inizio = np.cumsum(lunghezze) - lunghezze
+    piatto = np.concatenate(curricula) if curricula else np.empty(0, dtype=np.int16)
+
+    # Espando ogni classe sulle materie del suo curriculum
+    per_classe = lunghezze[codici]
+    idx_classe = np.repeat(np.arange(len(df_classi)), per_classe)
+    posizione = np.arange(len(idx_classe)) - np.repeat(np.cumsum(per_classe) - per_classe, per_classe)
+
+    return pd.DataFrame({
+        'id_classe': df_classi['id_classe'].to_numpy()[idx_classe],
+        'codicescuola': df_classi['codicescuola'].to_numpy()[idx_classe],
+        'id_materia': piatto[inizio[codici][idx_classe] + posizione]
+    })
+
 
 # ============================================================================
 # FASE 4: GENERAZIONE DOCENTI E ASSEGNAZIONI
 # ============================================================================
 """
 Genero i docenti e li assegno alle classi. Ogni docente insegna
-una specifica materia in più classi (cattedra).
+una specifica materia in più classi (cattedra), scelte tra le classi
+della stessa scuola.
 """
 
-print('Generazione docenti...')
-
-docenti = []
-assegnazioni = []
-docente_counter = 1
-
-# Creo una lista di tutte le combinazioni classe-materia da coprire
-classe_materia_records = []
-for id_classe, mats in materie_classe.items():
-    for m in mats:
-        classe_materia_records.append((id_classe, m))
-
-# Stimo il numero di docenti necessari
-total_cattedre_teoriche = len(classe_materia_records)
-stima_docenti = max(1, round(total_cattedre_teoriche / MEDIA_CLASSI_PER_DOCENTE))
-
-# Raggruppo le classi per materia per facilitare l'assegnazione
-materia_to_classi = defaultdict(list)
-for c, m in classe_materia_records:
-    materia_to_classi[m.upper()].append(c)
-
-# Genero docenti per ogni materia
-for materia_up, classi_list in materia_to_classi.items():
-    # Randomizzo l'ordine delle classi per distribuzioni casuali
-    random.shuffle(classi_list)
-
-    # Assegno gruppi di classi ai docenti
-    start = 0
-    while start < len(classi_list):
-        # Ogni docente prende un numero variabile di classi
-        span = random.randint(MIN_CLASSI_PER_DOCENTE, MAX_CLASSI_PER_DOCENTE)
-        subset = classi_list[start:start + span]
-        if not subset:
-            break
-        start += span
-
-        # Genero il docente
-        id_docente = f"DOC{docente_counter:05d}"
-        docente_counter += 1
-        nome = faker.first_name()
-        cognome = faker.last_name()
-        materia_norm = materia_up.title()  # Formato leggibile
-
-        docenti.append({
-            'id_docente': id_docente,
-            'nome': nome,
-            'cognome': cognome,
-            'materia': materia_norm
-        })
-
-        # Creo le assegnazioni per questo docente
-        for cid in subset:
-            assegnazioni.append({
-                'id_docente': id_docente,
-                'id_classe': cid,
-                'materia': materia_norm
-            })
-
-# Verifico la copertura: ogni classe-materia deve avere un docente
-coverage = {(a['id_classe'], a['materia'].upper()) for a in assegnazioni}
-missing = []
-for c, m in classe_materia_records:
-    if (c, m.upper()) not in coverage:
-        missing.append((c, m))
-
-# Genero docenti aggiuntivi per coprire eventuali mancanze
-for c, m in missing:
-    id_docente = f"DOC{docente_counter:05d}"
-    docente_counter += 1
-    nome = faker.first_name()
-    cognome = faker.last_name()
-
-    docenti.append({
-        'id_docente': id_docente,
-        'nome': nome,
-        'cognome': cognome,
-        'materia': m
+
+def genera_docenti(df_classi_materie: pd.DataFrame,
+                   rng: np.random.Generator) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+    """
+    Genero i docenti e le loro assegnazioni alle classi, scuola per scuola.
+
+    Le coppie classe-materia sono partizionate per (codicescuola, materia):
+    ogni docente insegna una sola materia in classi della stessa scuola. In
+    ogni partizione rimescolo le classi e le taglio in cattedre da
+    MIN_CLASSI_PER_DOCENTE a MAX_CLASSI_PER_DOCENTE classi con somme cumulate,
+    così ogni coppia riceve esattamente un docente per costruzione. Se le
+    classi rimaste per l'ultima cattedra sono meno di MIN_CLASSI_PER_DOCENTE
+    le unisco alla cattedra precedente, dividendo a metà l'unione se supera
+    MAX_CLASSI_PER_DOCENTE: solo le partizioni con meno di
+    MIN_CLASSI_PER_DOCENTE classi in tutto hanno un docente con meno classi.
+
+    Gli id_docente sono interi progressivi locali allo shard. Le assegnazioni
+    riportano anche l'id di catalogo della materia (id_materia), usato dalla
+    generazione dei voti e non scritto nei file finali.
+
+    Args:
+        df_classi_materie (pd.DataFrame): Coppie classe-materia da coprire
+            (id_classe, codicescuola, id_materia)
+        rng (np.random.Generator): Generatore casuale dello shard
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, int]: Docenti, assegnazioni e
+            stima iniziale del numero di docenti
+    """
+    n = len(df_classi_materie)
+
+    # Stimo il numero di docenti necessari
+    stima_docenti = max(1, round(n / MEDIA_CLASSI_PER_DOCENTE))
+
+    # Partiziono le coppie per (codicescuola, materia), nell'ordine di prima comparsa
+    partizione = df_classi_materie.groupby(['codicescuola', 'id_materia'], sort=False).ngroup().to_numpy()
+    dimensione = np.bincount(partizione)
+    inizio_partizione = np.cumsum(dimensione) - dimensione
+
+    # Randomizzo l'ordine delle classi all'interno di ogni partizione:
+    # dopo l'ordinamento ogni partizione occupa un intervallo contiguo
+    ordine = np.lexsort((rng.random(n), partizione))
+    id_classe = df_classi_materie['id_classe'].to_numpy()[ordine]
+    id_materia = df_classi_materie['id_materia'].to_numpy()[ordine].astype(np.int16)
+
+    # Estraggo per ogni partizione abbastanza cattedre da coprirla anche se
+    # fossero tutte minime, poi tengo quelle che iniziano entro la partizione
+    num_estratte = -(-dimensione // MIN_CLASSI_PER_DOCENTE)
+    span = rng.integers(MIN_CLASSI_PER_DOCENTE, MAX_CLASSI_PER_DOCENTE + 1, size=int(num_estratte.sum()))
+    part_span = np.repeat(np.arange(len(dimensione)), num_estratte)
+    inizio_cumulato = np.cumsum(span) - span
+    prima_estratta = np.cumsum(num_estratte) - num_estratte
+    inizio_locale = inizio_cumulato - np.repeat(inizio_cumulato[prima_estratta], num_estratte)
+    rimaste = dimensione[part_span] - inizio_locale
+
+    # Un'ultima cattedra troppo corta (non prima della partizione) si unisce
+    # alla precedente; se l'unione supera il massimo la divido a metà
+    precedente = np.concatenate([[0], inizio_locale[:-1]])
+    unione = dimensione[part_span] - precedente
+    corta = (rimaste > 0) & (rimaste < MIN_CLASSI_PER_DOCENTE) & (inizio_locale > 0)
+    divisa = corta & (unione > MAX_CLASSI_PER_DOCENTE)
+    inizio_locale = np.where(divisa, precedente + unione // 2, inizio_locale)
+    tenute = (rimaste > 0) & (~corta | divisa)
+    inizio_cattedra = (inizio_partizione[part_span] + inizio_locale)[tenute]
+
+    # Ogni coppia appartiene alla cattedra con l'ultimo inizio non successivo
+    # alla sua posizione: l'indice (da 1) della cattedra è l'id del docente
+    id_docente = np.searchsorted(inizio_cattedra, np.arange(n), side='right')
+    materia = CATALOGO.titoli[id_materia]  # Formato leggibile
+
+    # Estraggo i nomi dei docenti in blocco
+    df_docenti = pd.DataFrame({
+        'id_docente': np.arange(1, len(inizio_cattedra) + 1),
+        'materia': materia[inizio_cattedra]
     })
+    df_docenti.insert(1, 'nome', POOL_NOMI['nomi'].campiona(len(df_docenti), rng))
+    df_docenti.insert(2, 'cognome', POOL_NOMI['cognomi'].campiona(len(df_docenti), rng))
 
-    assegnazioni.append({
+    df_assegnazioni = pd.DataFrame({
         'id_docente': id_docente,
-        'id_classe': c,
-        'materia': m
+        'id_classe': id_classe,
+        'materia': materia,
+        'id_materia': id_materia
     })
 
-print(f"Docenti generati: {len(docenti)} (stima iniziale ≈ {stima_docenti})")
-
-# Salvo docenti e assegnazioni
-df_docenti = pd.DataFrame(docenti)
-df_assegnazioni = pd.DataFrame(assegnazioni)
+    return df_docenti, df_assegnazioni, stima_docenti
 
-# Rimuovo eventuali duplicati nelle assegnazioni
-if not df_assegnazioni.empty:
-    df_assegnazioni = df_assegnazioni.drop_duplicates(subset=['id_docente', 'id_classe', 'materia'])
-
-df_docenti.to_csv(os.path.join(OUTPUT_DIR, 'docenti.csv'), index=False)
-df_assegnazioni.to_csv(os.path.join(OUTPUT_DIR, 'assegnazioni_docenti.csv'), index=False)
-print(f"Assegnazioni create: {len(df_assegnazioni)}")
 
 # ============================================================================
 # FASE 5: GENERAZIONE VOTI
@@ -896,58 +1145,176 @@ Genero i voti degli studenti considerando molteplici fattori:
 - Tipologia di valutazione (scritto/orale/pratico)
 """
 
-print('Generazione voti con integrazione fattori socio-demografici...')
-
 # Configurazione temporale per le date dei voti
-DATA_INIZIO = datetime.date(2023, 9, 15)  # Inizio anno scolastico
-DATA_FINE = datetime.date(2024, 5, 31)  # Fine anno scolastico
-DELTA_GIORNI = (DATA_FINE - DATA_INIZIO).days
+DATA_INIZIO = datetime.date(2023, 9, 15)  # Inizio del primo anno scolastico
+DATA_FINE = datetime.date(2024, 5, 31)  # Fine del primo anno scolastico
+NUM_ANNI_SCOLASTICI = 1  # Anni scolastici consecutivi su cui distribuire i voti
+
+# Festività nazionali a data fissa (mese, giorno): niente lezioni
+FESTIVITA_FISSE = [
+    (11, 1),  # Ognissanti
+    (12, 8),  # Immacolata
+    (4, 25),  # Festa della Liberazione
+    (5, 1),  # Festa del Lavoro
+    (6, 2),  # Festa della Repubblica
+]
 
-# Preparo le strutture dati per l'accesso efficiente
-assegnazioni_per_classe = defaultdict(list)
-for _, r in df_assegnazioni.iterrows():
-    assegnazioni_per_classe[r['id_classe']].append((r['id_docente'], r['materia']))
+# Vacanze di Natale: dal 23 dicembre al 6 gennaio compresi
+VACANZE_NATALE = ((12, 23), (1, 6))
 
-voti_records = []
-voto_counter = 1
+# Vacanze di Pasqua: giorni rispetto alla domenica di Pasqua (dal giovedì al martedì)
+VACANZE_PASQUA = (-3, 2)
 
 
 # ============================================================================
-# FUNZIONI PER LA GENERAZIONE DEI VOTI
+# CALENDARIO SCOLASTICO
 # ============================================================================
-def tronca(v, lo, hi):
+"""
+Precalcolo una volta sola i giorni di lezione validi (esclusi domeniche,
+festività e vacanze) di tutti gli anni scolastici simulati. Le date dei voti
+sono estratte in blocco come indici in questo array e restano date native
+fino alla scrittura del file.
+"""
+
+
+def data_pasqua(anno: int) -> datetime.date:
     """
-    Limito un valore tra un minimo e un massimo.
+    Calcolo la data della domenica di Pasqua (calendario gregoriano).
+
+    Uso l'algoritmo anonimo gregoriano (Meeus/Jones/Butcher).
 
     Args:
-        v: Valore da limitare
-        lo: Limite inferiore
-        hi: Limite superiore
+        anno (int): Anno solare
 
     Returns:
-        Valore limitato nell'intervallo [lo, hi]
+        datetime.date: Domenica di Pasqua
+    """
+    a = anno % 19
+    b, c = divmod(anno, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mese, giorno = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(anno, mese, giorno + 1)
+
+
+def giorni_di_lezione(data_inizio: datetime.date, data_fine: datetime.date) -> np.ndarray:
     """
-    return max(lo, min(hi, v))
+    Calcolo i giorni di lezione di un anno scolastico.
 
+    Args:
+        data_inizio (datetime.date): Primo giorno dell'anno scolastico
+        data_fine (datetime.date): Ultimo giorno dell'anno scolastico
 
-# Genero abilità casuali per ogni studente (distribuzione normale)
-abilita_studente = {}
-for sid in df_studenti['id_studente']:
-    # Ogni studente ha un'abilità generale che influenza tutti i voti
-    abilita_studente[sid] = tronca(random.gauss(0, 0.6), -1.2, 1.2)
+    Returns:
+        np.ndarray: Giorni di lezione (datetime64[D]) in ordine crescente
+    """
+    giorni = np.arange(np.datetime64(data_inizio, 'D'), np.datetime64(data_fine, 'D') + 1)
+
+    # Il 1970-01-01 era un giovedì: (giorni dall'epoca + 3) % 7 vale 6 la domenica
+    domenica = (giorni.astype(np.int64) + 3) % 7 == 6
+
+    chiusi = []
+    for anno in range(data_inizio.year, data_fine.year + 1):
+        chiusi += [datetime.date(anno, mese, giorno) for mese, giorno in FESTIVITA_FISSE]
 
-# Dizionario per memorizzare le specificità studente-materia
-spec_studente_materia = {}
+        (mese_da, giorno_da), (mese_a, giorno_a) = VACANZE_NATALE
+        chiusi.append(np.arange(np.datetime64(datetime.date(anno, mese_da, giorno_da), 'D'),
+                                np.datetime64(datetime.date(anno + 1, mese_a, giorno_a), 'D') + 1))
 
-# Genero offset casuali per ogni combinazione classe-materia
-# Questo simula l'effetto del docente e delle dinamiche di classe
-offset_classe_materia = {}
-for cid, mats in materie_classe.items():
-    for m in mats:
-        offset_classe_materia[(cid, m.upper())] = tronca(random.gauss(0, 0.4), -0.9, 0.9)
+        pasqua = np.datetime64(data_pasqua(anno), 'D')
+        chiusi.append(np.arange(pasqua + VACANZE_PASQUA[0], pasqua + VACANZE_PASQUA[1] + 1))
 
+    chiusi = np.concatenate([np.atleast_1d(np.asarray(c, dtype='datetime64[D]')) for c in chiusi])
+    return giorni[~domenica & ~np.isin(giorni, chiusi)]
 
-def calcola_socio_demografico(id_studente: str) -> float:
+
+def calendario_scolastico() -> np.ndarray:
+    """
+    Costruisco il calendario di tutti gli anni scolastici simulati.
+
+    L'anno k va da DATA_INIZIO a DATA_FINE spostate in avanti di k anni.
+
+    Returns:
+        np.ndarray: Giorni di lezione (datetime64[D]) in ordine crescente
+    """
+    return np.concatenate([
+        giorni_di_lezione(DATA_INIZIO.replace(year=DATA_INIZIO.year + k),
+                          DATA_FINE.replace(year=DATA_FINE.year + k))
+        for k in range(NUM_ANNI_SCOLASTICI)
+    ])
+
+
+CALENDARIO = calendario_scolastico()
+
+
+# ============================================================================
+# FUNZIONI PER LA GENERAZIONE DEI VOTI
+# ============================================================================
+@dataclass
+class StatoLatente:
+    """
+    Componenti latenti del modello dei voti di uno shard, in array compatti.
+
+    Studenti, classi e materie hanno indici interi densi: lo studente e la
+    classe con id locale k occupano la riga k - 1, la materia la colonna
+    indicata da colonna_materia per il suo id di catalogo.
+    """
+    abilita: np.ndarray  # float32 (studenti): abilità generale
+    socio: np.ndarray  # float32 (studenti): impatto socio-demografico, calcolato una volta
+    offset: np.ndarray  # float32 (classi, materie): effetto classe/docente
+    spec: np.ndarray  # float32 (studenti, materie): specificità studente-materia
+    colonna_materia: np.ndarray  # id di catalogo -> colonna di offset e spec (-1 se assente)
+
+
+def genera_stato_latente(df_socio: pd.DataFrame, df_classi_materie: pd.DataFrame,
+                         rng: np.random.Generator) -> StatoLatente:
+    """
+    Genero le componenti latenti del modello dei voti.
+
+    Args:
+        df_socio (pd.DataFrame): Una riga per studente con gli attributi
+            socio-demografici, nell'ordine di studenti.csv
+        df_classi_materie (pd.DataFrame): Coppie classe-materia (id_classe, id_materia)
+        rng (np.random.Generator): Generatore casuale dello shard
+
+    Returns:
+        StatoLatente: Abilità, impatto socio-demografico, offset e specificità
+    """
+    num_studenti = len(df_socio)
+
+    # Ogni studente ha un'abilità generale che influenza tutti i voti
+    abilita = np.clip(rng.normal(0, 0.6, size=num_studenti), -1.2, 1.2).astype(np.float32)
+
+    # Genero offset casuali per ogni combinazione classe-materia
+    # Questo simula l'effetto del docente e delle dinamiche di classe
+    # Le colonne sono solo le materie presenti nello shard, in ordine di comparsa
+    id_materia = df_classi_materie['id_materia'].to_numpy()
+    righe = df_classi_materie['id_classe'].to_numpy() - 1
+    materie = pd.unique(id_materia)
+    colonna_materia = np.full(len(CATALOGO), -1, dtype=np.int16)
+    colonna_materia[materie] = np.arange(len(materie))
+    num_classi = int(righe.max()) + 1 if len(righe) else 0
+    offset = np.zeros((num_classi, len(materie)), dtype=np.float32)
+    offset[righe, colonna_materia[id_materia]] = np.clip(rng.normal(0, 0.4, size=len(id_materia)), -0.9, 0.9)
+
+    # Ogni studente può essere particolarmente bravo o scarso in una materia
+    spec = np.clip(rng.normal(0, 0.3, size=(num_studenti, len(materie))), -0.7, 0.7).astype(np.float32)
+
+    return StatoLatente(
+        abilita=abilita,
+        socio=calcola_socio_demografico(df_socio).astype(np.float32),
+        offset=offset,
+        spec=spec,
+        colonna_materia=colonna_materia
+    )
+
+
+def calcola_socio_demografico(df: pd.DataFrame) -> np.ndarray:
     """
     Calcolo l'impatto complessivo dei fattori socio-demografici sul rendimento.
 
@@ -957,30 +1324,86 @@ def calcola_socio_demografico(id_studente: str) -> float:
     - Cittadinanza (italiana/straniera)
     - Quartile ESCS (status socio-economico)
 
+    Il calcolo è vettoriale: ricevo un DataFrame con una riga per studente
+    e restituisco un array con l'impatto di ciascuno.
+
     Args:
-        id_studente (str): ID dello studente
+        df (pd.DataFrame): Colonne area_geografica, tipo_scuola,
+            cittadinanza ed escs_quartile
 
     Returns:
-        float: Impatto totale sul voto (-2 a +2 circa)
+        np.ndarray: Impatto totale sul voto (-2 a +2 circa) per ogni riga
     """
-    # Recupero i dati socio-demografici dello studente
-    dati = studenti_socio_demo.get(id_studente, {})
-
-    # Calcolo i singoli impatti
-    geo_impact = GEOGRAFIA_IMPACT.get(dati.get('area_geografica', 'CENTRO'), 0.0)
-    tipo_impact = TIPO_SCUOLA_IMPACT.get(dati.get('tipo_scuola', ''), 0.0)
-    citt_impact = CITTADINANZA_IMPACT.get(dati.get('cittadinanza', 'ITA'), 0.0)
-    escs_quartile = dati.get('escs_quartile', 2)
-    escs_impact = ESCS_QUARTILE_IMPACT.get(escs_quartile, 0.0)
+    # Calcolo i singoli impatti tramite mappature vettoriali
+    geo_impact = df['area_geografica'].map(GEOGRAFIA_IMPACT).fillna(0.0).to_numpy(dtype=float)
+    tipo_impact = df['tipo_scuola'].map(TIPO_SCUOLA_IMPACT).fillna(0.0).to_numpy(dtype=float)
+    citt_impact = df['cittadinanza'].map(CITTADINANZA_IMPACT).fillna(0.0).to_numpy(dtype=float)
+    escs_impact = df['escs_quartile'].map(ESCS_QUARTILE_IMPACT).fillna(0.0).to_numpy(dtype=float)
 
     # Combino gli impatti con pesi uguali
     # Potrei modificare i pesi per dare più importanza a certi fattori
     return geo_impact * 0.25 + tipo_impact * 0.25 + citt_impact * 0.25 + escs_impact * 0.25
 
 
-def voto_generato(id_studente, id_classe, materia, tipologia):
+def date_casuali(n: int, rng: np.random.Generator) -> np.ndarray:
     """
-    Genero un voto realistico considerando tutti i fattori.
+    Genero n date casuali tra i giorni di lezione in un'unica estrazione.
+
+    Le date restano native (datetime64): la forma ISO (YYYY-MM-DD) viene
+    prodotta solo da to_csv al momento della scrittura.
+
+    Args:
+        n (int): Numero di date da generare
+        rng (np.random.Generator): Generatore casuale dello shard
+
+    Returns:
+        np.ndarray: Date dei voti (datetime64[D])
+    """
+    return CALENDARIO[rng.integers(0, len(CALENDARIO), size=n)]
+
+
+def espandi_griglia_voti(df_stud: pd.DataFrame, df_ass: pd.DataFrame, rng: np.random.Generator):
+    """
+    Costruisco la griglia (studente, docente, materia, tipologia) dei voti.
+
+    Per ogni coppia studente-assegnazione estraggo il numero di voti (1-3),
+    prendo le tipologie più rilevanti per la materia e le rimescolo
+    all'interno della coppia, tutto con operazioni su array.
+
+    Args:
+        df_stud (pd.DataFrame): Studenti con id_studente e id_classe
+        df_ass (pd.DataFrame): Assegnazioni con id_classe, id_docente e materia
+        rng (np.random.Generator): Generatore casuale dello shard
+
+    Returns:
+        Tuple[pd.DataFrame, np.ndarray, np.ndarray]: coppie studente-assegnazione,
+            indice della coppia e indice della tipologia per ogni voto
+    """
+    # Una riga per ogni materia insegnata nella classe di ciascuno studente
+    coppie = df_stud[['id_studente', 'id_classe']].merge(
+        df_ass[['id_classe', 'id_docente', 'materia', 'id_materia']], on='id_classe', how='inner'
+    )
+
+    # Decido quanti voti generare per ogni coppia (1-3, tipicamente 2)
+    n_voti = rng.integers(1, 4, size=len(coppie))
+    idx_coppia = np.repeat(np.arange(len(coppie)), n_voti)
+    inizio = np.repeat(np.cumsum(n_voti) - n_voti, n_voti)
+    posizione = np.arange(len(idx_coppia)) - inizio
+
+    # Rimescolo le tipologie all'interno di ogni coppia
+    perm = np.lexsort((rng.random(len(idx_coppia)), idx_coppia))
+    posizione = posizione[perm]
+
+    # Tipologie di ogni materia in ordine di rilevanza (dal catalogo)
+    id_materia = coppie['id_materia'].to_numpy()
+    tipologie = CATALOGO.ordine_tipologie[id_materia[idx_coppia], posizione]
+
+    return coppie, idx_coppia, tipologie
+
+
+def calcola_voti(coppie, idx_coppia, tipologie, stato, rng):
+    """
+    Genero i voti di tutta la griglia in un'unica passata vettoriale.
 
     Il modello considera:
     - Base media generale (6.5)
@@ -993,200 +1416,476 @@ def voto_generato(id_studente, id_classe, materia, tipologia):
     - Rumore casuale
 
     Args:
-        id_studente (str): ID dello studente
-        id_classe (str): ID della classe
-        materia (str): Nome della materia
-        tipologia (str): Tipo di voto ('scritto', 'orale', 'pratico')
+        coppie (pd.DataFrame): Coppie studente-assegnazione
+        idx_coppia (np.ndarray): Indice della coppia per ogni voto
+        tipologie (np.ndarray): Indice tipologia per ogni voto
+        stato (StatoLatente): Componenti latenti del modello dei voti
+        rng (np.random.Generator): Generatore casuale dello shard
 
     Returns:
-        int: Voto da 1 a 10
+        np.ndarray: Voti interi da 1 a 10
     """
-    m_up = materia.upper()
+    n = len(idx_coppia)
+    id_materia = coppie['id_materia'].to_numpy()
+
+    # Indici densi di studente, classe e materia di ogni coppia
+    i_stud = coppie['id_studente'].to_numpy() - 1
+    i_classe = coppie['id_classe'].to_numpy() - 1
+    i_materia = stato.colonna_materia[id_materia]
+    nota = i_materia >= 0
+
+    # Componenti per coppia studente-assegnazione
+    cls_off = np.where(nota, stato.offset[i_classe, i_materia], 0.0)  # Effetto classe
+    stud = stato.abilita[i_stud]  # Abilità generale
+    socio = stato.socio[i_stud]  # Impatto socio-demografico
+    spec = np.where(nota, stato.spec[i_stud, i_materia], 0.0)  # Specificità nella materia
+
+    # Sommo i contributi per coppia e li espando sui singoli voti
+    # Difficoltà e aggiustamento per tipologia vengono dal catalogo delle materie
+    per_coppia = BASE_MEDIA + CATALOGO.difficolta[id_materia] + cls_off + stud + spec + socio
+    val = per_coppia[idx_coppia] + CATALOGO.delta_tipologia[id_materia[idx_coppia], tipologie]
 
-    # Componenti del voto
-    base = BASE_MEDIA  # 6.5
-    diff = MATERIA_DIFFICOLTA[m_up]  # Difficoltà della materia
-    cls_off = offset_classe_materia.get((id_classe, m_up), 0.0)  # Effetto classe
-    stud = abilita_studente.get(id_studente, 0.0)  # Abilità generale studente
+    # Rumore casuale per variabilità
+    val += rng.normal(0, 0.7, size=n)
 
-    # Genero o recupero la specificità studente-materia
-    key_spec = (id_studente, m_up)
-    if key_spec not in spec_studente_materia:
-        # Ogni studente può essere particolarmente bravo o scarso in una materia
-        spec_studente_materia[key_spec] = tronca(random.gauss(0, 0.3), -0.7, 0.7)
-    spec = spec_studente_materia[key_spec]
+    # Applico un "soft floor" per evitare troppi voti molto bassi
+    sotto_soglia = (val < SOFT_FLOOR_VOTO) & (rng.random(n) < 0.6)
+    val[sotto_soglia] = SOFT_FLOOR_VOTO + rng.random(sotto_soglia.sum())
 
-    # Aggiustamento per tipologia
-    tip_adj = tipologia_delta(materia, tipologia)
+    # Limito al range valido e arrotondo
+    return np.rint(np.clip(val, PESO_MIN_VOTO, PESO_MAX_VOTO)).astype(np.int8)
 
-    # Impatto socio-demografico
-    socio_demografico = calcola_socio_demografico(id_studente)
 
-    # Rumore casuale per variabilità
-    noise = random.gauss(0, 0.7)
+def genera_voti_a_blocchi(df_socio: pd.DataFrame, df_ass: pd.DataFrame, stato: StatoLatente,
+                          path_voti: str, rng: np.random.Generator,
+                          studenti_per_blocco: int = STUDENTI_PER_BLOCCO_VOTI):
+    """
+    Genero i voti per blocchi di studenti e li accodo al file dei voti man mano.
+
+    La memoria di picco dipende dalla dimensione del blocco e non dal numero
+    totale di voti. Le medie per cittadinanza, quartile ESCS e area
+    geografica sono calcolate con accumulatori (somma e conteggio) aggiornati
+    a ogni blocco, senza mai tenere in memoria tutti i voti.
+
+    Args:
+        df_socio (pd.DataFrame): Una riga per studente con id_studente, id_classe
+            e attributi socio-demografici, nell'ordine di studenti.csv
+        df_ass (pd.DataFrame): Assegnazioni docenti-classi-materie
+        stato (StatoLatente): Componenti latenti del modello dei voti
+        path_voti (str): Percorso del file dei voti da scrivere
+        rng (np.random.Generator): Generatore casuale dello shard
+        studenti_per_blocco (int): Numero di studenti per blocco
 
-    # Calcolo il voto finale sommando tutti i contributi
-    val = base + diff + cls_off + stud + spec + tip_adj + socio_demografico + noise
+    Returns:
+        Tuple[int, Dict[str, pd.Series], Dict[str, pd.Series]]: Numero di voti
+            scritti, somme e conteggi dei voti per dimensione di analisi
+    """
+    somme = {d: pd.Series(dtype=float) for d in DIMENSIONI_ANALISI}
+    conteggi = {d: pd.Series(dtype=float) for d in DIMENSIONI_ANALISI}
+    num_voti = 0
 
-    # Applico un "soft floor" a 3 per evitare troppi voti molto bassi
-    if val < 3 and random.random() < 0.6:
-        val = 3 + random.random() * 1.0
+    # Creo (o svuoto) il file: le intestazioni sono scritte solo nell'unione finale
+    open(path_voti, 'w').close()
 
-        # Limito al range valido e arrotondo
-    val = max(PESO_MIN_VOTO, min(PESO_MAX_VOTO, val))
-    return int(round(val))
+    for inizio in range(0, len(df_socio), studenti_per_blocco):
+        blocco = df_socio.iloc[inizio:inizio + studenti_per_blocco]
 
+        coppie, idx_coppia, tipologie = espandi_griglia_voti(blocco, df_ass, rng)
+        voti = calcola_voti(coppie, idx_coppia, tipologie, stato, rng)
+        id_studenti = coppie['id_studente'].to_numpy()[idx_coppia]
 
-def scegli_tipologie(materia: str, n: int) -> List[str]:
-    """
-    Scelgo quali tipologie di voto assegnare per una materia.
+        pd.DataFrame({
+            'id_studente': id_studenti,
+            'id_docente': coppie['id_docente'].to_numpy()[idx_coppia],
+            'materia': coppie['materia'].to_numpy()[idx_coppia],
+            'voto': voti,
+            'tipologia': np.array(TIPOLOGIE_ORDINE)[tipologie],
+            'data': date_casuali(len(voti), rng)
+        }).to_csv(path_voti, mode='a', header=False, index=False)
+        num_voti += len(voti)
+
+        # Aggiorno gli accumulatori delle medie
+        attributi = blocco.set_index('id_studente')[DIMENSIONI_ANALISI].reindex(id_studenti)
+        for d in DIMENSIONI_ANALISI:
+            gruppi = pd.Series(voti, dtype=float).groupby(attributi[d].to_numpy())
+            somme[d] = somme[d].add(gruppi.sum(), fill_value=0)
+            conteggi[d] = conteggi[d].add(gruppi.count(), fill_value=0)
+
+    return num_voti, somme, conteggi
+
+
+# ============================================================================
+# GENERAZIONE PER SHARD E UNIONE DEI RISULTATI
+# ============================================================================
+"""
+Classi, studenti, docenti e voti sono indipendenti tra scuole diverse una
+volta caricate le statistiche. Ogni shard di scuole viene generato da solo
+(anche in un processo separato) e scrive file parziali con id interi locali;
+l'unione finale rinumera studenti, docenti e voti con gli offset cumulati
+degli shard precedenti, così gli id restano univoci e consecutivi.
+
+Tutti gli id (anche quelli delle classi) restano interi durante la
+generazione: la forma testuale viene prodotta solo nella scrittura dei file
+finali, con un numero di cifre scelto in base ai totali di tutti gli shard.
+"""
+
+# Dimensioni di analisi per le medie dei voti
+DIMENSIONI_ANALISI = ['cittadinanza', 'escs_quartile', 'area_geografica']
+
+# Colonne dei file finali, nell'ordine di scrittura
+COLONNE_OUTPUT = {
+    'classi.csv': ['id_classe', 'codicescuola', 'indirizzo', 'indirizzo_norm', 'annocorso', 'nome_classe',
+                   'num_studenti', 'num_maschi', 'num_femmine', 'num_italiani', 'num_stranieri',
+                   'num_stranieri_ue', 'num_stranieri_non_ue', 'provincia', 'area_geografica'],
+    'studenti.csv': ['id_studente', 'id_classe', 'nome', 'cognome', 'sesso', 'cittadinanza',
+                     'escs', 'escs_quartile'],
+    'docenti.csv': ['id_docente', 'nome', 'cognome', 'materia'],
+    'assegnazioni_docenti.csv': ['id_docente', 'id_classe', 'materia'],
+    'voti.csv': ['id_voto', 'id_studente', 'id_docente', 'materia', 'voto', 'tipologia', 'data']
+}
 
-    La selezione si basa sui pesi specifici della materia
-    (es. Matematica ha più scritti, Ed. Fisica più pratici).
+# Tabelle pubblicate nel contesto per le fasi successive; i voti, che possono
+# essere centinaia di milioni di righe, restano solo su disco
+TABELLE_IN_MEMORIA = ['classi.csv', 'studenti.csv', 'docenti.csv', 'assegnazioni_docenti.csv']
+
+# Colonne dei file parziali degli shard: l'id_voto è assegnato solo nell'unione,
+# le classi conservano il progressivo per scuola da cui nasce il loro id testuale
+COLONNE_SHARD = {nome: [c for c in colonne if c != 'id_voto'] for nome, colonne in COLONNE_OUTPUT.items()}
+COLONNE_SHARD['classi.csv'] = COLONNE_SHARD['classi.csv'] + ['progressivo']
+
+
+def cifre_id(minimo: int, massimo: int) -> int:
+    """
+    Scelgo il numero di cifre di un tipo di id in base al valore massimo.
 
     Args:
-        materia (str): Nome della materia
-        n (int): Numero di tipologie da scegliere
+        minimo (int): Numero minimo di cifre (da configurazione)
+        massimo (int): Id più grande da scrivere
 
     Returns:
-        List[str]: Lista delle tipologie selezionate
+        int: Cifre sufficienti a scrivere tutti gli id con la stessa larghezza
     """
-    # Recupero i pesi per questa materia
-    pesi = TIPOLOGIA_PESI.get(materia.upper(), TIPOLOGIE_DEFAULT)
+    return max(minimo, len(str(massimo)))
+
+
+def formatta_id(prefisso: str, numeri, cifre: int) -> pd.Series:
+    """
+    Converto id interi nella forma testuale usata nei file finali (es. STU000001).
 
-    # Ordino per peso decrescente
-    sorted_pesi = sorted(pesi.items(), key=lambda x: x[1], reverse=True)
+    Args:
+        prefisso (str): Prefisso dell'id ('STU', 'DOC', 'VOT')
+        numeri: Id interi
+        cifre (int): Numero minimo di cifre
 
-    # Scelgo le tipologie più rilevanti
-    if n >= 3:
-        return ['scritto', 'orale', 'pratico']
-    if n == 2:
-        return [sorted_pesi[0][0], sorted_pesi[1][0]]
-    return [sorted_pesi[0][0]]
+    Returns:
+        pd.Series: Id testuali
+    """
+    return prefisso + pd.Series(numeri).astype(str).str.zfill(cifre).to_numpy()
 
 
-def data_random():
+def genera_shard(argomenti) -> dict:
     """
-    Genero una data casuale nell'anno scolastico.
+    Genero classi, studenti, docenti e voti di uno shard di scuole.
+
+    I file parziali sono scritti in dir_shard senza intestazione; classi,
+    studenti, docenti e voti usano id interi locali allo shard.
+
+    Args:
+        argomenti (tuple): (df_ind dello shard, df_stats dello shard,
+            SeedSequence dello shard, directory dei file parziali)
 
     Returns:
-        str: Data in formato ISO (YYYY-MM-DD)
+        dict: Conteggi e accumulatori dello shard per l'unione finale
     """
-    g = random.randint(0, DELTA_GIORNI)
-    return (DATA_INIZIO + datetime.timedelta(days=g)).isoformat()
+    df_ind, df_stats, seme, dir_shard = argomenti
+    rng = np.random.default_rng(seme)
+    os.makedirs(dir_shard, exist_ok=True)
 
+    df_classi = genera_classi(df_ind, df_stats)
+    df_classi[COLONNE_SHARD['classi.csv']].to_csv(os.path.join(dir_shard, 'classi.csv'), header=False, index=False)
 
-# ============================================================================
-# GENERAZIONE EFFETTIVA DEI VOTI
-# ============================================================================
-"""
-Per ogni studente, genero voti in tutte le materie della sua classe.
-Il numero e tipo di voti varia per materia.
-"""
+    df_studenti = genera_studenti(df_classi, rng)
+    df_studenti.to_csv(os.path.join(dir_shard, 'studenti.csv'), header=False, index=False)
 
-for _, stud in df_studenti.iterrows():
-    id_stu = stud['id_studente']
-    cid = stud['id_classe']
-
-    # Recupero le assegnazioni docenti per questa classe
-    assegn = assegnazioni_per_classe.get(cid, [])
-
-    # Per ogni materia nella classe
-    for id_docente, materia in assegn:
-        # Decido quanti voti generare (1-3, tipicamente 2)
-        n_voti = random.choice([1, 2, 3])
-
-        # Scelgo le tipologie appropriate per questa materia
-        tipologie = scegli_tipologie(materia, n_voti)
-        random.shuffle(tipologie)
-
-        # Genero ogni voto
-        for t in tipologie:
-            id_voto = f"VOT{voto_counter:07d}"
-            voto_counter += 1
-
-            voti_records.append({
-                'id_voto': id_voto,
-                'id_studente': id_stu,
-                'id_docente': id_docente,
-                'materia': materia,
-                'voto': voto_generato(id_stu, cid, materia, t),
-                'tipologia': t,
-                'data': data_random()
-            })
+    df_classi_materie = mappa_materie_classi(df_classi)
+    df_docenti, df_assegnazioni, stima_docenti = genera_docenti(df_classi_materie, rng)
+    df_docenti.to_csv(os.path.join(dir_shard, 'docenti.csv'), header=False, index=False)
+    df_assegnazioni[COLONNE_OUTPUT['assegnazioni_docenti.csv']].to_csv(
+        os.path.join(dir_shard, 'assegnazioni_docenti.csv'), header=False, index=False
+    )
 
-# ============================================================================
-# ANALISI DELL'IMPATTO DEI FATTORI SOCIO-DEMOGRAFICI
-# ============================================================================
-"""
-Verifico che i fattori socio-demografici abbiano l'effetto atteso
-stampando statistiche aggregate.
-"""
+    # Attributi socio-demografici di ogni studente, nell'ordine di studenti.csv
+    df_socio = df_studenti[['id_studente', 'id_classe', 'cittadinanza', 'escs_quartile']].merge(
+        df_classi[['id_classe', 'area_geografica', 'indirizzo_norm']], on='id_classe', how='left'
+    ).rename(columns={'indirizzo_norm': 'tipo_scuola'})
 
-print('Statistiche voti con fattori socio-demografici...')
-if voti_records:
-    # Creo un DataFrame temporaneo per l'analisi
-    temp_df = pd.DataFrame(voti_records)
+    stato = genera_stato_latente(df_socio, df_classi_materie, rng)
+    num_voti, somme, conteggi = genera_voti_a_blocchi(
+        df_socio, df_assegnazioni, stato, os.path.join(dir_shard, 'voti.csv'), rng
+    )
 
-    # Aggiungo i dati degli studenti per l'analisi
-    temp_df = temp_df.merge(df_studenti[['id_studente', 'cittadinanza', 'escs_quartile']], on='id_studente')
+    return {
+        'classi': len(df_classi),
+        'progressivo_classi': int(df_classi['progressivo'].max()) if len(df_classi) else 0,
+        'studenti': len(df_studenti),
+        'docenti': len(df_docenti),
+        'assegnazioni': len(df_assegnazioni),
+        'voti': num_voti,
+        'stima_docenti': stima_docenti,
+        'cittadinanza': df_studenti['cittadinanza'].value_counts(),
+        'escs_quartile': df_studenti['escs_quartile'].value_counts(),
+        'somme_voti': somme,
+        'conteggi_voti': conteggi
+    }
 
-    # Media voti per cittadinanza
-    print('\nMedia voti per cittadinanza:')
-    print(temp_df.groupby('cittadinanza')['voto'].mean().round(2))
 
-    # Media voti per quartile ESCS
-    print('\nMedia voti per quartile ESCS:')
-    print(temp_df.groupby('escs_quartile')['voto'].mean().round(2))
+def formatta_shard(argomenti) -> Dict[str, pd.DataFrame]:
+    """
+    Porto i file parziali di uno shard agli id globali definitivi.
 
-    # Aggiungo area geografica per l'analisi
-    temp_df = temp_df.merge(df_studenti[['id_studente', 'id_classe']], on='id_studente')
-    temp_df = temp_df.merge(df_classi[['id_classe', 'area_geografica']], on='id_classe')
+    Qui, e solo qui, gli id interi diventano testuali: le classi prendono la
+    forma codicescuola_nnnn dal loro progressivo per scuola, studenti,
+    docenti e voti i prefissi STU, DOC e VOT dopo la rinumerazione globale.
+    Le tabelle piccole tornano al chiamante, i voti sono riscritti su disco.
 
-    # Media voti per area geografica
-    print('\nMedia voti per area geografica:')
-    print(temp_df.groupby('area_geografica')['voto'].mean().round(2))
+    Args:
+        argomenti (tuple): (directory dello shard, offset di studenti,
+            docenti e voti degli shard precedenti, cifre di ogni tipo di id)
+
+    Returns:
+        Dict[str, pd.DataFrame]: Tabelle di TABELLE_IN_MEMORIA dello shard
+    """
+    dir_shard, offset, cifre = argomenti
+
+    def leggi(nome, **kwargs):
+        path = os.path.join(dir_shard, nome)
+        colonne = COLONNE_SHARD[nome]
+        # Uno shard senza righe produce un file vuoto, che read_csv rifiuta
+        if os.path.getsize(path) == 0:
+            vuoto = pd.DataFrame(columns=colonne)
+            return [vuoto] if 'chunksize' in kwargs else vuoto
+        return pd.read_csv(path, header=None, keep_default_na=False, names=colonne, **kwargs)
+
+    tabelle = {}
+
+    def scrivi(df, nome, mode='w'):
+        df[COLONNE_OUTPUT[nome]].to_csv(os.path.join(dir_shard, f'parte_{nome}'),
+                                        mode=mode, header=False, index=False)
+
+    def conserva(df, nome):
+        tabelle[nome] = df[COLONNE_OUTPUT[nome]]
+
+    # Id testuale di ogni classe, indicizzato per id locale - 1
+    df = leggi('classi.csv')
+    id_classi = (df['codicescuola'].astype(str) + '_' +
+                 df['progressivo'].astype(str).str.zfill(cifre['classi'])).to_numpy()
+    df['id_classe'] = id_classi
+    conserva(df, 'classi.csv')
+
+    df = leggi('studenti.csv', dtype={'escs': str})
+    df['id_studente'] = formatta_id('STU', df['id_studente'] + offset['studenti'], cifre['studenti'])
+    df['id_classe'] = id_classi[df['id_classe'].to_numpy(dtype=int) - 1]
+    conserva(df, 'studenti.csv')
+
+    df = leggi('docenti.csv')
+    df['id_docente'] = formatta_id('DOC', df['id_docente'] + offset['docenti'], cifre['docenti'])
+    conserva(df, 'docenti.csv')
+
+    df = leggi('assegnazioni_docenti.csv')
+    df['id_docente'] = formatta_id('DOC', df['id_docente'] + offset['docenti'], cifre['docenti'])
+    df['id_classe'] = id_classi[df['id_classe'].to_numpy(dtype=int) - 1]
+    conserva(df, 'assegnazioni_docenti.csv')
+
+    # I voti possono essere molti: li riscrivo a blocchi
+    open(os.path.join(dir_shard, 'parte_voti.csv'), 'w').close()
+    voto_counter = offset['voti'] + 1
+    for df in leggi('voti.csv', chunksize=RIGHE_PER_BLOCCO_SCRITTURA):
+        df['id_voto'] = formatta_id('VOT', np.arange(voto_counter, voto_counter + len(df)), cifre['voti'])
+        df['id_studente'] = formatta_id('STU', df['id_studente'] + offset['studenti'], cifre['studenti'])
+        df['id_docente'] = formatta_id('DOC', df['id_docente'] + offset['docenti'], cifre['docenti'])
+        scrivi(df, 'voti.csv', mode='a')
+        voto_counter += len(df)
+
+    return tabelle
+
+
+def unisci_shard(dir_shards: List[str]) -> None:
+    """
+    Concateno le parti formattate di tutti gli shard nei file finali che non
+    passano dalla memoria (i voti).
+
+    Args:
+        dir_shards (List[str]): Directory degli shard, in ordine
+    """
+    for nome, colonne in COLONNE_OUTPUT.items():
+        if nome in TABELLE_IN_MEMORIA:
+            continue
+        with open(os.path.join(OUTPUT_DIR, nome), 'wb') as out:
+            out.write((','.join(colonne) + '\n').encode())
+            for dir_shard in dir_shards:
+                with open(os.path.join(dir_shard, f'parte_{nome}'), 'rb') as parte:
+                    shutil.copyfileobj(parte, out)
+
+
+def esegui_in_parallelo(funzione, argomenti: list, num_processi: int) -> list:
+    """
+    Applico una funzione a una lista di argomenti, in parallelo se richiesto.
+
+    L'ordine dei risultati è sempre quello degli argomenti.
+
+    Args:
+        funzione: Funzione da applicare (deve essere definita a livello di modulo)
+        argomenti (list): Argomenti, uno per chiamata
+        num_processi (int): Numero di processi (1 = esecuzione nel processo corrente)
+
+    Returns:
+        list: Risultati nell'ordine degli argomenti
+    """
+    if num_processi <= 1 or len(argomenti) <= 1:
+        return [funzione(a) for a in argomenti]
+    with ProcessPoolExecutor(max_workers=min(num_processi, len(argomenti))) as executor:
+        return list(executor.map(funzione, argomenti))
 
-# Salvo i voti generati
-print('Salvataggio voti...')
-df_voti = pd.DataFrame(voti_records)
-df_voti.to_csv(os.path.join(OUTPUT_DIR, 'voti.csv'), index=False)
-print(f"Voti generati: {len(df_voti)}")
 
 # ============================================================================
-# STATISTICHE FINALI E COPIE FILE
+# ESECUZIONE
 # ============================================================================
-"""
-Stampo statistiche riassuntive e copio i file necessari nella
-directory di output per avere tutto in un unico posto.
-"""
-
-print('\n=== STATISTICHE FINALI ===')
-print(f'Totale studenti: {len(df_studenti)}')
+def esegui(contesto: Optional[dict] = None) -> Optional[dict]:
+    """
+    Eseguo la generazione completa: shard in parallelo, rinumerazione e unione.
 
-# Statistiche cittadinanza
-ita_count = len(df_studenti[df_studenti.cittadinanza == "ITA"])
-ue_count = len(df_studenti[df_studenti.cittadinanza == "UE"])
-non_ue_count = len(df_studenti[df_studenti.cittadinanza == "NON_UE"])
+    Args:
+        contesto (dict): Tabelle condivise tra le fasi eseguite nello stesso
+            processo (None quando lo script è eseguito da solo)
 
-print(f'- Italiani: {ita_count} ({ita_count / len(df_studenti) * 100:.1f}%)')
-print(f'- Stranieri UE: {ue_count} ({ue_count / len(df_studenti) * 100:.1f}%)')
-print(f'- Stranieri non-UE: {non_ue_count} ({non_ue_count / len(df_studenti) * 100:.1f}%)')
+    Returns:
+        dict: Il contesto ricevuto, con classi, studenti, docenti e
+            assegnazioni generati (i voti restano solo su disco)
+    """
+    print('Caricamento CSV di input...')
+    df_ind, df_stats = carica_input(contesto)
+
+    # Divido le scuole in shard di dimensione fissa, nell'ordine del file:
+    # la suddivisione non dipende dal numero di processi
+    codici = pd.unique(df_ind['codicescuola'])
+    shard_di_scuola = pd.Series(np.arange(len(codici)) // SCUOLE_PER_SHARD, index=codici)
+    num_shard = int(shard_di_scuola.max()) + 1 if len(codici) else 0
+    semi = np.random.SeedSequence(SEED).spawn(num_shard)
+
+    dir_temp = os.path.join(OUTPUT_DIR, '_shard')
+    shutil.rmtree(dir_temp, ignore_errors=True)
+    dir_shards = [os.path.join(dir_temp, f'shard_{i:05d}') for i in range(num_shard)]
+
+    argomenti = []
+    for i, df_ind_shard in df_ind.groupby(df_ind['codicescuola'].map(shard_di_scuola), sort=True):
+        codici_shard = df_ind_shard['codicescuola'].unique()
+        df_stats_shard = df_stats[df_stats['codicescuola'].isin(codici_shard)]
+        argomenti.append((df_ind_shard, df_stats_shard, semi[i], dir_shards[i]))
+
+    print(f'Generazione classi, studenti, docenti e voti: {num_shard} shard su {NUM_PROCESSI} processi...')
+    risultati = esegui_in_parallelo(genera_shard, argomenti, NUM_PROCESSI)
+
+    # Offset cumulati degli shard precedenti per la rinumerazione globale
+    offset = {k: 0 for k in ['studenti', 'docenti', 'voti']}
+    offset_shard = []
+    for ris in risultati:
+        offset_shard.append(dict(offset))
+        for k in offset:
+            offset[k] += ris[k]
+
+    # Larghezza degli id testuali, uguale per tutti gli shard: dipende dai totali finali
+    cifre = {
+        'classi': cifre_id(CIFRE_ID_CLASSE, max((r['progressivo_classi'] for r in risultati), default=0)),
+        'studenti': cifre_id(CIFRE_ID_STUDENTE, offset['studenti']),
+        'docenti': cifre_id(CIFRE_ID_DOCENTE, offset['docenti']),
+        'voti': cifre_id(CIFRE_ID_VOTO, offset['voti'])
+    }
+    argomenti_formato = [(d, o, cifre) for d, o in zip(dir_shards, offset_shard)]
+
+    print('Rinumerazione e unione dei file degli shard...')
+    tabelle_shard = esegui_in_parallelo(formatta_shard, argomenti_formato, NUM_PROCESSI)
+    for nome in TABELLE_IN_MEMORIA:
+        parti = [t[nome] for t in tabelle_shard]
+        df = pd.concat(parti, ignore_index=True) if parti else pd.DataFrame(columns=COLONNE_OUTPUT[nome])
+        salva_tabella(contesto, df, os.path.join(OUTPUT_DIR, nome))
+    del tabelle_shard
+    unisci_shard(dir_shards)
+    shutil.rmtree(dir_temp, ignore_errors=True)
+
+    def totale(chiave):
+        return sum(r[chiave] for r in risultati)
+
+    print(f"Classi generate: {totale('classi')}")
+    print(f"Studenti generati: {totale('studenti')}")
+    print(f"Docenti generati: {totale('docenti')} (stima iniziale ≈ {totale('stima_docenti')})")
+    print(f"Assegnazioni create: {totale('assegnazioni')}")
+
+    # ========================================================================
+    # ANALISI DELL'IMPATTO DEI FATTORI SOCIO-DEMOGRAFICI
+    # ========================================================================
+    # Verifico che i fattori socio-demografici abbiano l'effetto atteso
+    # stampando le medie accumulate durante la generazione
+    num_voti = totale('voti')
+    print('Statistiche voti con fattori socio-demografici...')
+    if num_voti > 0:
+        medie_voti = {}
+        for d in DIMENSIONI_ANALISI:
+            somme = pd.concat([r['somme_voti'][d] for r in risultati]).groupby(level=0).sum()
+            conteggi = pd.concat([r['conteggi_voti'][d] for r in risultati]).groupby(level=0).sum()
+            medie_voti[d] = (somme / conteggi).sort_index().rename('voto').rename_axis(d)
+
+        # Media voti per cittadinanza
+        print('\nMedia voti per cittadinanza:')
+        print(medie_voti['cittadinanza'].round(2))
+
+        # Media voti per quartile ESCS
+        print('\nMedia voti per quartile ESCS:')
+        print(medie_voti['escs_quartile'].round(2))
+
+        # Media voti per area geografica
+        print('\nMedia voti per area geografica:')
+        print(medie_voti['area_geografica'].round(2))
+
+    print(f"Voti generati: {num_voti}")
+
+    # ========================================================================
+    # STATISTICHE FINALI E COPIE FILE
+    # ========================================================================
+    # Stampo statistiche riassuntive e copio i file necessari nella
+    # directory di output per avere tutto in un unico posto
+    num_studenti = totale('studenti')
+    cittadinanza = pd.concat([r['cittadinanza'] for r in risultati]).groupby(level=0).sum()
+    quartili = pd.concat([r['escs_quartile'] for r in risultati]).groupby(level=0).sum()
+
+    print('\n=== STATISTICHE FINALI ===')
+    print(f'Totale studenti: {num_studenti}')
+
+    # Statistiche cittadinanza
+    ita_count = int(cittadinanza.get('ITA', 0))
+    ue_count = int(cittadinanza.get('UE', 0))
+    non_ue_count = int(cittadinanza.get('NON_UE', 0))
+
+    print(f'- Italiani: {ita_count} ({ita_count / num_studenti * 100:.1f}%)')
+    print(f'- Stranieri UE: {ue_count} ({ue_count / num_studenti * 100:.1f}%)')
+    print(f'- Stranieri non-UE: {non_ue_count} ({non_ue_count / num_studenti * 100:.1f}%)')
+
+    # Distribuzione ESCS
+    print('\nDistribuzione ESCS:')
+    for q in range(1, 5):
+        count = int(quartili.get(q, 0))
+        print(f'- Quartile {q}: {count} studenti ({count / num_studenti * 100:.1f}%)')
+
+    # Copio l'anagrafica nella directory di output per completezza
+    shutil.copy2(
+        os.path.join(INPUT_DIR, 'anagrafica_scuole_pulita.csv'),
+        os.path.join(OUTPUT_DIR, 'anagrafica.csv')
+    )
+    print('Copia anagrafica completata.')
 
-# Distribuzione ESCS
-print('\nDistribuzione ESCS:')
-for q in range(1, 5):
-    count = len(df_studenti[df_studenti.escs_quartile == q])
-    print(f'- Quartile {q}: {count} studenti ({count / len(df_studenti) * 100:.1f}%)')
+    print('\n✅ Pipeline completata con integrazione fattori socio-demografici.')
 
-# Copio l'anagrafica nella directory di output per completezza
-shutil.copy2(
-    os.path.join(INPUT_DIR, 'anagrafica_scuole_pulita.csv'),
-    os.path.join(OUTPUT_DIR, 'anagrafica.csv')
-)
-print('Copia anagrafica completata.')
+    return contesto
 
-print('\n✅ Pipeline completata con integrazione fattori socio-demografici.')
 
 # ============================================================================
 # NOTE FINALI
@@ -1210,7 +1909,11 @@ I voti sono influenzati da:
 
 Questo produce un dataset realistico che riflette le disparità
 educative osservate nel sistema scolastico italiano.
+
+Per sfruttare più core impostare NUM_PROCESSI: a parità di SEED il
+risultato è identico qualunque sia il numero di processi, perché dipende
+solo dalla suddivisione in shard (SCUOLE_PER_SHARD).
 """
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    esegui()
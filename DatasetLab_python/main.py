@@ -19,33 +19,509 @@ Data: Giugno 2025
 import subprocess  # Per eseguire script Python esterni
 import time  # Per misurare i tempi di esecuzione
 import os  # Per gestire i percorsi dei file
+import ast  # Per leggere le costanti di configurazione degli script
+import json  # Per il manifest delle esecuzioni
+import hashlib  # Per l'impronta di script e file
+import argparse  # Per le opzioni da riga di comando
+import importlib  # Per eseguire le fasi nello stesso processo
+import traceback  # Per riportare gli errori delle fasi eseguite nel processo
+import platform  # Per descrivere la macchina nel report
+import threading  # Per campionare la memoria durante le fasi
+import sys
+
+try:
+    import resource  # Per il picco di memoria (disponibile solo su sistemi Unix)
+except ImportError:
+    resource = None
 
 # ============================================================================
 # CONFIGURAZIONE
 # ============================================================================
 # Determino la directory corrente per costruire i percorsi relativi
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+FILE_DIR = os.path.join(CURRENT_DIR, '../file')
+
+# Manifest con l'impronta di input, codice e configurazione di ogni fase eseguita
+PATH_MANIFEST = os.path.join(FILE_DIR, 'manifest_pipeline.json')
+
+# Cartella dei report di prestazioni, uno per esecuzione della pipeline
+REPORT_DIR = os.path.join(FILE_DIR, 'report_esecuzioni')
+
+# Intervallo di campionamento della memoria residente durante ogni fase
+INTERVALLO_MEMORIA_S = 0.1
 
 
 # ============================================================================
 # FUNZIONI DI UTILITÀ
 # ============================================================================
-def esegui_script(nome_script, descrizione):
+def hash_file(path, impronte_precedenti=None):
+    """
+    Calcolo l'impronta SHA-256 del contenuto di un file.
+
+    Se il file ha dimensione e data di modifica uguali a quelle registrate
+    nell'esecuzione precedente riuso l'impronta salvata, così non rileggo
+    ogni volta file di diversi GB come voti.csv. Nella stessa lettura conto
+    le righe di dati (record CSV, esclusa l'intestazione) per il report delle
+    prestazioni: gli a capo dentro i campi tra virgolette non contano.
+
+    Args:
+        path (str): Percorso del file
+        impronte_precedenti (dict): Impronte registrate nel manifest, per percorso
+
+    Returns:
+        dict: Dimensione, data di modifica, impronta e righe del file (None se manca)
+    """
+    if not os.path.exists(path):
+        return None
+
+    stat = os.stat(path)
+    nome = os.path.relpath(path, FILE_DIR)
+    precedente = (impronte_precedenti or {}).get(nome)
+    if (precedente and 'righe' in precedente
+            and precedente['size'] == stat.st_size and precedente['mtime_ns'] == stat.st_mtime_ns):
+        return precedente
+
+    h = hashlib.sha256()
+    righe = 0
+    tra_virgolette = False
+    ultimo = b'\n'
+    with open(path, 'rb') as f:
+        for blocco in iter(lambda: f.read(1 << 20), b''):
+            h.update(blocco)
+            fini, tra_virgolette = conta_fine_record(blocco, tra_virgolette)
+            righe += fini
+            ultimo = blocco[-1:]
+    # Conto anche un'ultima riga senza a capo finale e tolgo l'intestazione
+    righe += ultimo != b'\n'
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': h.hexdigest(),
+            'righe': max(0, righe - 1)}
+
+
+def conta_fine_record(blocco, tra_virgolette):
+    """
+    Conto gli a capo che chiudono un record CSV in un blocco di byte.
+
+    Un a capo fa parte di un valore se cade dentro un campo tra virgolette,
+    cioè dopo un numero dispari di virgolette dall'inizio del file (le
+    virgolette raddoppiate di escape non cambiano la parità). Divido il
+    blocco sulle virgolette: i pezzi di posto pari sono fuori dai campi
+    tra virgolette se il blocco inizia fuori, quelli dispari altrimenti.
+
+    Args:
+        blocco (bytes): Blocco letto dal file
+        tra_virgolette (bool): Se il blocco inizia dentro un campo tra virgolette
+
+    Returns:
+        Tuple[int, bool]: A capo che chiudono un record e stato alla fine del blocco
+    """
+    if b'"' not in blocco:
+        return (0 if tra_virgolette else blocco.count(b'\n')), tra_virgolette
+
+    pezzi = blocco.split(b'"')
+    fuori = b''.join(pezzi[1 if tra_virgolette else 0::2])
+    return fuori.count(b'\n'), tra_virgolette != (len(pezzi) % 2 == 0)
+
+
+def costanti_script(script_path):
+    """
+    Leggo le costanti di configurazione dichiarate a livello di modulo in uno script.
+
+    Analizzo il sorgente con ast senza eseguirlo e tengo gli assegnamenti
+    con valore letterale semplice (ModalitaRidotta, NUM_SCUOLE, SEED,
+    MEDIA_ALUNNI_PER_CLASSE, ...).
+
+    Args:
+        script_path (str): Percorso dello script
+
+    Returns:
+        dict: Nome e valore di ogni costante
+    """
+    with open(script_path, encoding='utf-8') as f:
+        albero = ast.parse(f.read())
+
+    costanti = {}
+    for nodo in albero.body:
+        if isinstance(nodo, ast.Assign) and len(nodo.targets) == 1 and isinstance(nodo.targets[0], ast.Name):
+            try:
+                valore = ast.literal_eval(nodo.value)
+            except ValueError:
+                continue
+            if valore is None or isinstance(valore, (bool, int, float, str)):
+                costanti[nodo.targets[0].id] = valore
+    return costanti
+
+
+def moduli_locali(script_path):
+    """
+    Trovo i moduli della pipeline importati da uno script (es. schema.py).
+
+    Seguo anche gli import dei moduli locali trovati: uno script che usa
+    contesto_pipeline.py dipende anche da schema.py.
+
+    Args:
+        script_path (str): Percorso dello script
+
+    Returns:
+        List[str]: Percorsi dei moduli locali importati, ordinati
+    """
+    trovati = set()
+    da_visitare = [script_path]
+    while da_visitare:
+        with open(da_visitare.pop(), encoding='utf-8') as f:
+            albero = ast.parse(f.read())
+
+        nomi = set()
+        for nodo in ast.walk(albero):
+            if isinstance(nodo, ast.Import):
+                nomi.update(alias.name for alias in nodo.names)
+            elif isinstance(nodo, ast.ImportFrom) and nodo.module:
+                nomi.add(nodo.module)
+
+        for n in nomi:
+            percorso = os.path.join(CURRENT_DIR, f'{n}.py')
+            if os.path.exists(percorso) and percorso not in trovati and percorso != script_path:
+                trovati.add(percorso)
+                da_visitare.append(percorso)
+
+    return sorted(trovati)
+
+
+def impronta_fase(fase, impronte_precedenti):
+    """
+    Calcolo l'impronta di una fase: codice, configurazione e file di input.
+
+    Args:
+        fase (dict): Definizione della fase
+        impronte_precedenti (dict): Impronte dei file registrate nel manifest
+
+    Returns:
+        dict: Impronta della fase, confrontabile con quella del manifest
+    """
+    script_path = os.path.join(CURRENT_DIR, fase['script'])
+    codice = {
+        os.path.basename(p): hash_file(p)['sha256']
+        for p in [script_path] + moduli_locali(script_path)
+    }
+    input_fase = {}
+    for nome in fase['input']:
+        impronta = hash_file(os.path.join(FILE_DIR, nome), impronte_precedenti)
+        input_fase[nome] = impronta['sha256'] if impronta else None
+
+    return {
+        'codice': codice,
+        'costanti': costanti_script(script_path),
+        'input': input_fase
+    }
+
+
+def output_invariati(fase, voce_manifest):
+    """
+    Verifico che gli output registrati di una fase esistano e non siano stati modificati.
+
+    Args:
+        fase (dict): Definizione della fase
+        voce_manifest (dict): Voce del manifest relativa alla fase
+
+    Returns:
+        bool: True se tutti gli output corrispondono al manifest
+    """
+    registrati = voce_manifest.get('output', {})
+    for nome in fase['output']:
+        attuale = hash_file(os.path.join(FILE_DIR, nome), voce_manifest.get('file', {}))
+        if attuale is None or registrati.get(nome) != attuale['sha256']:
+            return False
+    return True
+
+
+def carica_manifest():
+    """
+    Carico il manifest delle esecuzioni precedenti (vuoto se non esiste o è illeggibile).
+
+    Returns:
+        dict: Una voce per fase, indicizzata per nome dello script
+    """
+    try:
+        with open(PATH_MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def salva_manifest(manifest):
+    """
+    Salvo il manifest in modo atomico, così un'interruzione non lo corrompe.
+
+    Args:
+        manifest (dict): Manifest da salvare
+    """
+    os.makedirs(os.path.dirname(PATH_MANIFEST), exist_ok=True)
+    temporaneo = PATH_MANIFEST + '.tmp'
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporaneo, PATH_MANIFEST)
+
+
+def registra_fase(manifest, fase, impronta, impronte_precedenti=None):
+    """
+    Registro nel manifest l'impronta e gli output di una fase appena completata.
+
+    Args:
+        manifest (dict): Manifest da aggiornare
+        fase (dict): Definizione della fase
+        impronta (dict): Impronta calcolata prima dell'esecuzione
+        impronte_precedenti (dict): Impronte dei file già calcolate, per percorso
+
+    Returns:
+        dict: Informazioni (dimensione, impronta, righe) sui file della fase
+    """
+    file_fase = {}
+    for nome in list(fase['input']) + list(fase['output']):
+        info = hash_file(os.path.join(FILE_DIR, nome), impronte_precedenti)
+        if info is not None:
+            file_fase[nome] = info
+
+    manifest[fase['script']] = dict(
+        impronta,
+        output={nome: file_fase[nome]['sha256'] for nome in fase['output'] if nome in file_fase},
+        file=file_fase,
+        completata=time.strftime('%Y-%m-%d %H:%M:%S')
+    )
+    salva_manifest(manifest)
+    return file_fase
+
+
+def misura_risorse():
+    """
+    Leggo tempo, CPU consumata e massimo storico di memoria fino a questo momento.
+
+    La CPU comprende i processi figli già terminati (fasi eseguite con
+    subprocess e processi della generazione parallela).
+
+    Il massimo storico (ru_maxrss del processo e dei figli) non si azzera
+    mai: alla fine di una fase vale il picco più alto di tutta l'esecuzione
+    fino a quel momento, non quello della fase. Il picco di ogni fase è
+    misurato da MonitorMemoria.
+
+    Returns:
+        dict: Tempo reale e CPU in secondi, massimo storico della memoria
+            residente in MB
+    """
+    tempi = os.times()
+    misura = {
+        'tempo': time.perf_counter(),
+        'cpu': tempi.user + tempi.system + tempi.children_user + tempi.children_system,
+        'picco_rss_cumulativo_mb': None
+    }
+    if resource is not None:
+        picco = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        misura['picco_rss_cumulativo_mb'] = maxrss_in_mb(picco)
+    return misura
+
+
+def maxrss_in_mb(maxrss):
+    """
+    Converto in MB un valore ru_maxrss.
+
+    Args:
+        maxrss (int): Valore di ru_maxrss (KB su Linux, byte su macOS)
+
+    Returns:
+        float: Memoria in MB
+    """
+    unita = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(maxrss / unita, 1)
+
+
+def figli_processo(pid):
+    """
+    Elenco i figli diretti di un processo.
+
+    Leggo /proc/<pid>/task/<tid>/children (solo Linux): visito così i soli
+    discendenti della pipeline, senza scorrere tutti i processi del sistema.
+
+    Args:
+        pid (int): Processo di cui cercare i figli
+
+    Returns:
+        List[int]: Pid dei figli (vuota se il processo è terminato o il
+            kernel non espone l'elenco dei figli)
+    """
+    figli = []
+    try:
+        thread = os.listdir(f'/proc/{pid}/task')
+    except OSError:
+        return figli
+    for tid in thread:
+        try:
+            with open(f'/proc/{pid}/task/{tid}/children', 'rb') as f:
+                figli.extend(int(p) for p in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return figli
+
+
+def rss_albero_processi(pid):
+    """
+    Misuro la memoria residente di un processo e di tutti i suoi discendenti.
+
+    Parto dal processo e scendo di figlio in figlio (vedi figli_processo),
+    leggendo la memoria residente da /proc/<pid>/statm. I processi che
+    terminano durante la lettura vengono ignorati.
+
+    Args:
+        pid (int): Processo radice
+
+    Returns:
+        float: Memoria residente totale in MB, o None se /proc non è disponibile
+    """
+    if not os.path.isdir(f'/proc/{pid}'):
+        return None
+
+    pagine = 0
+    da_visitare = [pid]
+    while da_visitare:
+        corrente = da_visitare.pop()
+        try:
+            with open(f'/proc/{corrente}/statm', 'rb') as f:
+                pagine += int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        da_visitare.extend(figli_processo(corrente))
+    return round(pagine * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+
+# Il campionamento è sospeso durante ogni fork (es. il pool di processi della
+# generazione): il processo figlio non eredita un campione a metà, né un
+# file di /proc aperto dal thread del monitor
+_lock_campionamento = threading.Lock()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_lock_campionamento.acquire,
+                        after_in_parent=_lock_campionamento.release,
+                        after_in_child=_lock_campionamento.release)
+
+
+class MonitorMemoria:
+    """
+    Campiono in un thread la memoria residente durante una fase.
+
+    Il picco parte da zero a ogni fase e somma il processo principale e i
+    suoi discendenti (fasi in subprocess, processi della generazione
+    parallela). Picchi più brevi di INTERVALLO_MEMORIA_S possono sfuggire.
+    Dove /proc non esiste il picco resta None. Ogni campione è preso sotto
+    _lock_campionamento, che i fork attendono e tengono fino alla fine.
+    """
+
+    def __init__(self, intervallo=INTERVALLO_MEMORIA_S):
+        self.intervallo = intervallo
+        self.picco_mb = None
+        self._fine = threading.Event()
+        self._thread = threading.Thread(target=self._campiona, daemon=True)
+
+    def _aggiorna(self):
+        with _lock_campionamento:
+            rss = rss_albero_processi(os.getpid())
+        if rss is not None and (self.picco_mb is None or rss > self.picco_mb):
+            self.picco_mb = rss
+
+    def _campiona(self):
+        while not self._fine.wait(self.intervallo):
+            self._aggiorna()
+
+    def __enter__(self):
+        self._aggiorna()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *eccezione):
+        self._fine.set()
+        self._thread.join()
+        self._aggiorna()
+        return False
+
+
+def report_fase(fase, prima, dopo, picco_mb, file_fase):
+    """
+    Costruisco la voce del report di prestazioni per una fase eseguita.
+
+    Args:
+        fase (dict): Definizione della fase
+        prima (dict): Risorse misurate all'inizio della fase
+        dopo (dict): Risorse misurate alla fine della fase
+        picco_mb (float): Picco di memoria residente della fase (None se non misurabile)
+        file_fase (dict): Informazioni sui file di input e output della fase
+
+    Returns:
+        dict: Tempi, memoria e righe lette/scritte della fase
+    """
+    durata = dopo['tempo'] - prima['tempo']
+    letti = {n: file_fase[n]['righe'] for n in fase['input'] if n in file_fase}
+    scritti = {n: file_fase[n]['righe'] for n in fase['output'] if n in file_fase}
+
+    def al_secondo(righe):
+        return round(righe / durata, 1) if durata > 0 else None
+
+    return {
+        'fase': fase['nome'],
+        'script': fase['script'],
+        'eseguita': True,
+        'tempo_s': round(durata, 3),
+        'cpu_s': round(dopo['cpu'] - prima['cpu'], 3),
+        # Picco della sola fase: processo principale e discendenti
+        'picco_rss_mb': picco_mb,
+        # Massimo storico dall'avvio della pipeline (non si azzera tra le fasi)
+        'picco_rss_cumulativo_mb': dopo['picco_rss_cumulativo_mb'],
+        'righe_lette': letti,
+        'righe_scritte': scritti,
+        'righe_lette_al_s': al_secondo(sum(letti.values())),
+        'righe_scritte_al_s': al_secondo(sum(scritti.values()))
+    }
+
+
+def salva_report(report):
+    """
+    Salvo il report di prestazioni di un'esecuzione in REPORT_DIR.
+
+    Ogni esecuzione produce un file con lo stesso schema, nominato con data
+    e ora di avvio, così le esecuzioni si possono confrontare tra loro.
+
+    Args:
+        report (dict): Report da salvare
+
+    Returns:
+        str: Percorso del file scritto
+    """
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, f"esecuzione_{report['id']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def esegui_script(nome_script, descrizione, contesto=None):
     """
     Eseguo uno script Python e monitoro il suo completamento.
 
     Questa funzione si occupa di:
     - Costruire il percorso completo dello script
-    - Eseguirlo tramite subprocess
+    - Eseguirlo nello stesso processo (funzione esegui del modulo) oppure
+      tramite subprocess se non ho un contesto condiviso
     - Misurare il tempo di esecuzione
     - Gestire eventuali errori fermando l'intera pipeline
 
+    Nello stesso processo le tabelle prodotte da una fase passano alle
+    successive attraverso il contesto, senza rileggere i CSV, e librerie
+    come pandas, NumPy e Faker vengono importate una sola volta.
+
     Args:
         nome_script (str): Nome del file Python da eseguire
         descrizione (str): Descrizione leggibile della fase per il logging
+        contesto (dict): Tabelle condivise tra le fasi (None = subprocess)
 
     Returns:
-        None
+        float: Picco di memoria residente del subprocess e dei suoi discendenti
+            in MB, letto con os.wait4 (None nello stesso processo o se
+            wait4 non è disponibile)
 
     Raises:
         SystemExit: Se lo script fallisce, interrompo l'intera pipeline
@@ -59,14 +535,41 @@ def esegui_script(nome_script, descrizione):
     # Registro il tempo di inizio per calcolare la durata
     inizio = time.time()
 
+    if contesto is not None:
+        try:
+            # Importo il modulo della fase ed eseguo la sua funzione principale
+            modulo = importlib.import_module(os.path.splitext(nome_script)[0])
+            modulo.esegui(contesto)
+
+            durata = round(time.time() - inizio, 2)
+            print(f"Completato: {descrizione} in {durata} secondi.")
+
+        except Exception as e:
+            # Stesso comportamento del subprocess: riporto l'errore e termino tutto
+            traceback.print_exc()
+            print(f"❌ Errore durante l'esecuzione di {script_path}!")
+            print(f"Dettagli: {e}")
+            exit(1)
+        return None
+
     try:
-        # Eseguo lo script Python come processo separato
-        # check=True solleva un'eccezione se lo script termina con errore
-        subprocess.run(['python', script_path], check=True)
+        # Eseguo lo script Python come processo separato. Con wait4 ottengo
+        # anche le risorse usate dal solo figlio (e dai suoi discendenti)
+        picco_mb = None
+        processo = subprocess.Popen(['python', script_path])
+        if hasattr(os, 'wait4'):
+            _, stato, risorse = os.wait4(processo.pid, 0)
+            processo.returncode = os.waitstatus_to_exitcode(stato)
+            picco_mb = maxrss_in_mb(risorse.ru_maxrss)
+        else:
+            processo.wait()
+        if processo.returncode != 0:
+            raise subprocess.CalledProcessError(processo.returncode, processo.args)
 
         # Calcolo e mostro il tempo impiegato
         durata = round(time.time() - inizio, 2)
         print(f"Completato: {descrizione} in {durata} secondi.")
+        return picco_mb
 
     except subprocess.CalledProcessError as e:
         # Se lo script fallisce, informo l'utente e termino tutto
@@ -80,26 +583,155 @@ def esegui_script(nome_script, descrizione):
 # ============================================================================
 # Definisco l'ordine preciso delle fasi e i loro script corrispondenti
 # L'ordine è importante: ogni fase dipende dai risultati della precedente
+# Input e output sono relativi alla cartella file/ e servono per decidere
+# se una fase è già aggiornata
+ORIGINALI = 'dataset_originali'
+PULITI = 'dataset_puliti'
+DEFINITIVI = 'dataset_definitivi'
+
 fasi = [
-    ('pulizia_mim.py', 'Pulizia dei file MIUR'),
-    ('calcolo_statistiche.py', 'Generazione statistiche per simulazione'),
-    ('genera_dati_simulati.py', 'Generazione dei dati simulati'),
-    ('analisi_dataset.py', 'Analisi del dataset simulato')
+    {
+        'nome': 'pulizia',
+        'script': 'pulizia_mim.py',
+        'descrizione': 'Pulizia dei file MIUR',
+        'input': [f'{ORIGINALI}/AnagScuole.csv', f'{ORIGINALI}/AnagScuoleProvAutonome.csv',
+                  f'{ORIGINALI}/Stu_Cittad.csv', f'{ORIGINALI}/Stu_Indirizzo.csv',
+                  f'{ORIGINALI}/Stu_Corso_Classe_Genere.csv'],
+        'output': [f'{PULITI}/anagrafica_scuole_pulita.csv', f'{PULITI}/stu_cittadinanza_pulito.csv',
+                   f'{PULITI}/stu_indirizzi_pulito.csv']
+    },
+    {
+        'nome': 'statistiche',
+        'script': 'calcolo_statistiche.py',
+        'descrizione': 'Generazione statistiche per simulazione',
+        'input': [f'{PULITI}/anagrafica_scuole_pulita.csv', f'{PULITI}/stu_cittadinanza_pulito.csv',
+                  f'{PULITI}/stu_indirizzi_pulito.csv'],
+        'output': [f'{PULITI}/statistiche_base.csv']
+    },
+    {
+        'nome': 'generazione',
+        'script': 'genera_dati_simulati.py',
+        'descrizione': 'Generazione dei dati simulati',
+        'input': [f'{PULITI}/anagrafica_scuole_pulita.csv', f'{PULITI}/stu_indirizzi_pulito.csv',
+                  f'{PULITI}/statistiche_base.csv'],
+        'output': [f'{DEFINITIVI}/anagrafica.csv', f'{DEFINITIVI}/classi.csv', f'{DEFINITIVI}/studenti.csv',
+                   f'{DEFINITIVI}/docenti.csv', f'{DEFINITIVI}/assegnazioni_docenti.csv',
+                   f'{DEFINITIVI}/voti.csv']
+    },
+    {
+        'nome': 'analisi',
+        'script': 'analisi_dataset.py',
+        'descrizione': 'Analisi del dataset simulato',
+        'input': [f'{PULITI}/anagrafica_scuole_pulita.csv', f'{PULITI}/stu_cittadinanza_pulito.csv',
+                  f'{PULITI}/stu_indirizzi_pulito.csv', f'{DEFINITIVI}/classi.csv',
+                  f'{DEFINITIVI}/studenti.csv', f'{DEFINITIVI}/docenti.csv',
+                  f'{DEFINITIVI}/assegnazioni_docenti.csv', f'{DEFINITIVI}/voti.csv'],
+        'output': []
+    }
 ]
+NOMI_FASI = [f['nome'] for f in fasi]
 
 # ============================================================================
 # ESECUZIONE DELLA PIPELINE
 # ============================================================================
-# Messaggio di benvenuto che spiega cosa sta per accadere
-print("🚀 Avvio pipeline completa: fasi 1 → 6\n")
+def main():
+    """
+    Eseguo la pipeline saltando le fasi già aggiornate.
+
+    La funzione main protegge l'esecuzione dall'import del modulo: i processi
+    figli avviati dalla fase di generazione non devono rilanciare la pipeline.
+    """
+    # Opzioni per forzare la riesecuzione di fasi già aggiornate
+    parser = argparse.ArgumentParser(description='Pipeline di generazione del dataset scolastico simulato')
+    parser.add_argument('--forza', nargs='+', choices=NOMI_FASI, default=[],
+                        help='Riesegue le fasi indicate anche se aggiornate')
+    parser.add_argument('--forza-da', choices=NOMI_FASI,
+                        help='Riesegue la fase indicata e tutte quelle successive')
+    parser.add_argument('--forza-tutto', action='store_true',
+                        help='Riesegue tutte le fasi ignorando il manifest')
+    parser.add_argument('--sottoprocessi', action='store_true',
+                        help='Esegue ogni fase in un interprete separato invece che nello stesso processo')
+    args = parser.parse_args()
+
+    forzate = set(args.forza)
+    if args.forza_da:
+        forzate.update(NOMI_FASI[NOMI_FASI.index(args.forza_da):])
+    if args.forza_tutto:
+        forzate.update(NOMI_FASI)
+
+    # Messaggio di benvenuto che spiega cosa sta per accadere
+    print("🚀 Avvio pipeline completa: fasi 1 → 6\n")
+
+    # Eseguo ogni fase in sequenza, saltando quelle con codice, configurazione
+    # e input invariati rispetto all'ultima esecuzione riuscita.
+    # Una fase rieseguita cambia i propri output e quindi l'impronta delle
+    # fasi successive, che vengono rieseguite a cascata.
+    # Se una fase fallisce, la pipeline si interrompe automaticamente
+    manifest = carica_manifest()
+    contesto = None if args.sottoprocessi else {}
+
+    # Report di prestazioni dell'esecuzione, salvato anche se una fase fallisce
+    inizio_pipeline = misura_risorse()
+    report = {
+        'id': time.strftime('%Y%m%d_%H%M%S'),
+        'modalita': 'sottoprocessi' if args.sottoprocessi else 'in_processo',
+        'sistema': {
+            'piattaforma': platform.platform(),
+            'python': platform.python_version(),
+            'cpu': os.cpu_count()
+        },
+        'esito': 'interrotta',
+        'fasi': []
+    }
+
+    try:
+        for fase in fasi:
+            voce = manifest.get(fase['script'])
+            impronta = impronta_fase(fase, voce.get('file', {}) if voce else {})
 
-# Eseguo ogni fase in sequenza
-# Se una fase fallisce, la pipeline si interrompe automaticamente
-for script, descrizione in fasi:
-    esegui_script(script, descrizione)
+            aggiornata = (
+                voce is not None
+                and all(voce.get(k) == impronta[k] for k in impronta)
+                and output_invariati(fase, voce)
+            )
+            if aggiornata and fase['nome'] not in forzate:
+                print(f"\nSaltata: {fase['descrizione']} (input, codice e configurazione invariati)")
+                report['fasi'].append({'fase': fase['nome'], 'script': fase['script'], 'eseguita': False,
+                                       'costanti': impronta['costanti']})
+                continue
+
+            # Rimuovo la voce prima di eseguire: se la fase fallisce resta da rifare
+            manifest.pop(fase['script'], None)
+            salva_manifest(manifest)
+
+            prima = misura_risorse()
+            with MonitorMemoria() as monitor:
+                picco_figlio_mb = esegui_script(fase['script'], fase['descrizione'], contesto)
+            dopo = misura_risorse()
+
+            # In subprocess il picco del figlio da wait4 non dipende dal campionamento
+            picchi = [p for p in (monitor.picco_mb, picco_figlio_mb) if p is not None]
+            picco_mb = max(picchi) if picchi else None
+
+            file_fase = registra_fase(manifest, fase, impronta, voce.get('file', {}) if voce else {})
+            report['fasi'].append(dict(report_fase(fase, prima, dopo, picco_mb, file_fase),
+                                       costanti=impronta['costanti']))
+
+        report['esito'] = 'completata'
+    finally:
+        fine_pipeline = misura_risorse()
+        report['totale'] = {
+            'tempo_s': round(fine_pipeline['tempo'] - inizio_pipeline['tempo'], 3),
+            'cpu_s': round(fine_pipeline['cpu'] - inizio_pipeline['cpu'], 3),
+            'picco_rss_mb': max((f['picco_rss_mb'] for f in report['fasi']
+                                 if f.get('picco_rss_mb') is not None), default=None),
+            'picco_rss_cumulativo_mb': fine_pipeline['picco_rss_cumulativo_mb']
+        }
+        print(f"\n📈 Report prestazioni: {salva_report(report)}")
+
+    # Se arrivo qui, tutte le fasi sono state completate con successo
+    print("\n🎉 Tutte le fasi completate con successo! Il dataset è pronto per essere usato.")
 
-# Se arrivo qui, tutte le fasi sono state completate con successo
-print("\n🎉 Tutte le fasi completate con successo! Il dataset è pronto per essere usato.")
 
 # ============================================================================
 # NOTE PER L'UTILIZZO
@@ -108,6 +740,24 @@ print("\n🎉 Tutte le fasi completate con successo! Il dataset è pronto per es
 Per eseguire questo script:
     python main.py
 
+Le fasi già aggiornate vengono saltate: il manifest ../file/manifest_pipeline.json
+registra per ogni fase l'impronta dello script, delle costanti di configurazione
+e dei file di input e output. Per rieseguire comunque:
+    python main.py --forza analisi          (solo le fasi indicate)
+    python main.py --forza-da generazione   (la fase e tutte le successive)
+    python main.py --forza-tutto            (tutta la pipeline)
+
+Le fasi vengono eseguite nello stesso processo e si passano le tabelle in
+memoria; i CSV sono comunque scritti su disco. Per eseguire ogni fase in un
+interprete separato, come i singoli script:
+    python main.py --sottoprocessi
+
+Ogni esecuzione scrive un report JSON in ../file/report_esecuzioni/ con,
+per ogni fase: tempo reale, tempo CPU, picco di memoria residente della fase
+(picco_rss_mb, campionato ogni INTERVALLO_MEMORIA_S secondi e, con
+--sottoprocessi, letto anche dal figlio con wait4), massimo storico dall'avvio
+(picco_rss_cumulativo_mb), righe lette e scritte per file e righe al secondo.
+
 Assicurarsi che:
 - Tutti gli script delle fasi siano presenti nella stessa directory
 - I file MIUR originali siano nella cartella ../file/dataset_originali/
@@ -117,4 +767,7 @@ In caso di errore:
 - Controllare i log dell'ultima fase eseguita
 - Verificare che i file di input esistano
 - Controllare lo spazio su disco disponibile
-"""
\ No newline at end of file
+"""
+
+if __name__ == '__main__':
+    main()
@@ -20,7 +20,15 @@ Data: Giugno 2025
 """
 
 import pandas as pd
+import numpy as np
 import os
+import json
+import hashlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from contesto_pipeline import salva_tabella
 
 # ============================================================================
 # CONFIGURAZIONE
@@ -28,6 +36,7 @@ import os
 # Modalità ridotta: se True, lavoro solo su un campione di scuole per velocizzare
 ModalitaRidotta = True
 NUM_SCUOLE = 200  # Numero di scuole da campionare in modalità ridotta
+SEED_CAMPIONAMENTO = 42  # Seme delle chiavi casuali usate per il campionamento
 
 # Determino la directory base per costruire i percorsi relativi
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -40,6 +49,57 @@ PATH_STU_CITTAD = os.path.join(BASE_DIR, '../file/dataset_originali/Stu_Cittad.c
 PATH_STU_INDIRIZZO = os.path.join(BASE_DIR, '../file/dataset_originali/Stu_Indirizzo.csv')
 PATH_STU_CORSO_CLASSE = os.path.join(BASE_DIR, '../file/dataset_originali/Stu_Corso_Classe_Genere.csv')
 
+# Lettura a blocchi: i file nazionali vengono letti a pezzi di questa dimensione
+# e di ogni pezzo tengo solo le righe delle scuole secondarie di II grado
+# (None = lettura dell'intero file in un colpo solo)
+RIGHE_PER_BLOCCO_LETTURA = 200000
+ORDINE_SCUOLA = 'SCUOLA SECONDARIA II GRADO'
+
+# Thread per pulire in parallelo anagrafica, cittadinanza e indirizzi
+NUM_THREAD_PULIZIA = 3
+
+# Cache binaria dei file originali già letti, filtrati e proiettati:
+# se il file MIUR non cambia, le esecuzioni successive non rileggono il CSV
+USA_CACHE_MIUR = True
+CACHE_MIUR_DIR = os.path.join(BASE_DIR, '../file/cache/miur')
+CACHE_MIUR_MAX_MB = 2048  # Oltre questa dimensione elimino le voci usate meno di recente
+
+# Colonne da rimuovere perché non necessarie per la simulazione:
+# non vengono nemmeno lette dai file originali
+drop_cols_anag = [
+    'ANNOSCOLASTICO',  # Sempre uguale per tutti
+    'CAPSCUOLA',  # CAP non necessario
+    'INDIRIZZOSCUOLA',  # Indirizzo fisico non necessario
+    'INDICAZIONESEDEDIRETTIVO',  # Info amministrative non necessarie
+    'INDICAZIONESEDEOMNICOMPRENSIVO',
+    'INDIRIZZOEMAILSCUOLA',  # Contatti non necessari
+    'INDIRIZZOPECSCUOLA',
+    'SITOWEBSCUOLA',
+    'SEDESCOLASTICA'
+]
+drop_cols_cittad = ['ANNOSCOLASTICO', 'ORDINESCUOLA']  # Già filtrati altrove
+drop_cols_ind = ['ANNOSCOLASTICO', 'ORDINESCUOLA']
+
+# Colonne usate da questa fase e dalle successive: se mancano in un file
+# originale mi fermo subito invece di fallire a metà pipeline
+COLONNE_RICHIESTE = {
+    PATH_STU_CORSO_CLASSE: ['CODICESCUOLA', 'ORDINESCUOLA'],
+    PATH_ANAG_SCUOLE: ['CODICESCUOLA', 'DENOMINAZIONESCUOLA', 'REGIONE', 'PROVINCIA', 'DESCRIZIONECOMUNE'],
+    PATH_ANAG_SCUOLE_PA: ['CODICESCUOLA', 'DENOMINAZIONESCUOLA', 'REGIONE', 'PROVINCIA', 'DESCRIZIONECOMUNE'],
+    PATH_STU_CITTAD: ['CODICESCUOLA', 'ANNOCORSO', 'ALUNNI', 'ALUNNICITTADINANZAITALIANA',
+                      'ALUNNICITTADINANZANONITALIANA'],
+    PATH_STU_INDIRIZZO: ['CODICESCUOLA', 'TIPOPERCORSO', 'INDIRIZZO', 'ANNOCORSO', 'ALUNNIMASCHI', 'ALUNNIFEMMINE']
+}
+
+# Colonne geografiche e di categoria con pochi valori distinti: durante la
+# pulizia diventano categoriche ordinate alfabeticamente, così ordinamento e
+# rimozione dei duplicati lavorano sui codici interi invece che sulle stringhe.
+# Il codice scuola, quasi univoco, resta testuale
+COLONNE_CATEGORICHE = [
+    'AREAGEOGRAFICA', 'REGIONE', 'PROVINCIA', 'CODICECOMUNESCUOLA',
+    'DESCRIZIONECOMUNE', 'TIPOPERCORSO', 'INDIRIZZO', 'ANNOCORSO'
+]
+
 
 # ============================================================================
 # FUNZIONI DI UTILITÀ PER LA PULIZIA
@@ -60,7 +120,43 @@ def normalize_string(x):
     return str(x).strip().upper()
 
 
-def clean_string_columns(df):
+def normalize_string_column(serie, categorica=False):
+    """
+    Normalizzo una colonna testuale come normalize_string, ma in modo vettoriale.
+
+    Fattorizzo la colonna: ogni valore distinto viene normalizzato una sola
+    volta con l'accessor .str e il risultato viene riportato sulle righe
+    tramite i codici. Nei file MIUR i valori distinti (regioni, comuni,
+    indirizzi, numeri di alunni) sono molti meno delle righe.
+
+    A differenza di map(normalize_string) i valori mancanti restano mancanti
+    (e non diventano la stringa "NAN"), così i dropna successivi funzionano.
+
+    Args:
+        serie (pd.Series): Colonna da normalizzare
+        categorica (bool): Se True restituisco una colonna categorica con le
+            categorie in ordine alfabetico
+
+    Returns:
+        pd.Series: Colonna normalizzata, con gli stessi indici
+    """
+    codici, valori = pd.factorize(serie)
+    normalizzati = pd.Index(valori).astype(str).str.strip().str.upper()
+
+    if categorica:
+        # Valori diversi possono coincidere dopo la normalizzazione: li
+        # rifattorizzo in ordine alfabetico e rimappo i codici delle righe
+        codici_norm, categorie = pd.factorize(normalizzati, sort=True)
+        codici = np.where(codici >= 0, codici_norm[codici], -1)
+        colonna = pd.Categorical.from_codes(codici, categories=categorie, ordered=True)
+        return pd.Series(colonna, index=serie.index, name=serie.name)
+
+    # Aggiungo in coda il valore mancante, selezionato dal codice -1
+    tabella = np.append(normalizzati.to_numpy(dtype=object), np.nan)
+    return pd.Series(tabella[codici], index=serie.index, name=serie.name)
+
+
+def clean_string_columns(df, categoriche=False):
     """
     Applico la normalizzazione a tutte le colonne testuali di un DataFrame.
 
@@ -69,16 +165,39 @@ def clean_string_columns(df):
 
     Args:
         df (pd.DataFrame): DataFrame da pulire
+        categoriche (bool): Se True le colonne di COLONNE_CATEGORICHE diventano
+            categoriche ordinate (vedi come_testo per riconvertirle)
 
     Returns:
         pd.DataFrame: DataFrame con colonne testuali normalizzate
     """
-    # Identifico solo le colonne di tipo object (stringhe)
-    for col in df.select_dtypes(include='object'):
-        df[col] = df[col].map(normalize_string)
+    # Identifico solo le colonne testuali (object o str)
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            categorica = categoriche and normalize_string(col) in COLONNE_CATEGORICHE
+            df[col] = normalize_string_column(df[col], categorica)
     return df
 
 
+def come_testo(df):
+    """
+    Riconverto in colonne testuali le colonne categoriche create dalla pulizia.
+
+    I file salvati e le tabelle passate alle fasi successive restano così
+    identici a quelli ottenuti senza colonne categoriche. Converto in object
+    (come normalize_string_column): i valori mancanti restano mancanti,
+    mentre con astype(str) su pandas 2 diventerebbero la stringa "nan".
+
+    Args:
+        df (pd.DataFrame): DataFrame pulito
+
+    Returns:
+        pd.DataFrame: DataFrame con sole colonne testuali
+    """
+    categoriche = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    return df.astype({col: object for col in categoriche})
+
+
 def snake_case_columns(df):
     """
     Converto i nomi delle colonne in snake_case (minuscolo con underscore).
@@ -108,12 +227,414 @@ def report_stats(name, original_len, cleaned_df):
     print(f"📊 {name}: {original_len} → {len(cleaned_df)} righe (rimossi {original_len - len(cleaned_df)})")
 
 
+def colonna_chiave(df, nome):
+    """
+    Restituisco normalizzata una colonna chiave, cercandola senza badare a maiuscole e spazi.
+
+    Args:
+        df (pd.DataFrame): DataFrame letto dal file originale
+        nome (str): Nome normalizzato della colonna (es. 'CODICESCUOLA')
+
+    Returns:
+        pd.Series: Colonna con i valori normalizzati
+    """
+    for col in df.columns:
+        if normalize_string(col) == nome:
+            return normalize_string_column(df[col])
+    raise KeyError(f"Colonna {nome} mancante nel file MIUR")
+
+
+def proiezione_colonne(path, drop_cols=None):
+    """
+    Scelgo le colonne da leggere da un file MIUR guardando solo l'intestazione.
+
+    Leggo tutte le colonne tranne quelle in drop_cols; senza drop_cols leggo
+    solo le colonne richieste (es. il file degli ordini di scuola, che serve
+    solo per i codici). I nomi sono confrontati dopo la normalizzazione.
+
+    Args:
+        path (str): Percorso del file CSV
+        drop_cols (list): Colonne da scartare (None = solo le colonne richieste)
+
+    Returns:
+        List[str]: Nomi delle colonne da leggere, come compaiono nel file
+
+    Raises:
+        ValueError: Se nel file manca una colonna richiesta
+    """
+    intestazione = list(pd.read_csv(path, dtype=str, nrows=0).columns)
+    normalizzate = {normalize_string(col): col for col in intestazione}
+    richieste = COLONNE_RICHIESTE.get(path, [])
+
+    mancanti = [c for c in richieste if c not in normalizzate]
+    if mancanti:
+        raise ValueError(
+            f"{os.path.basename(path)}: colonne richieste mancanti {mancanti}. "
+            f"Colonne presenti: {intestazione}"
+        )
+
+    if drop_cols is None:
+        return [normalizzate[c] for c in richieste]
+    scartate = {normalize_string(c) for c in drop_cols}
+    return [col for col in intestazione if normalize_string(col) not in scartate]
+
+
+# ============================================================================
+# CACHE DEI FILE ORIGINALI
+# ============================================================================
+# Ogni voce della cache contiene il risultato di blocchi_filtrati per un file
+# MIUR, con i valori già normalizzati: la chiave combina impronta del file
+# (dimensione, data di modifica e SHA-256 del contenuto), colonne lette e
+# filtro applicato. Il formato è Feather (Arrow IPC) se pyarrow è installato,
+# altrimenti pickle.
+#
+# Una voce è una directory con una parte per ogni blocco letto dal CSV: anche
+# dalla cache i file vengono riletti un blocco alla volta, così la memoria di
+# picco resta quella di un blocco e non dell'intero file filtrato.
+#
+# Il filtro delle fonti di dettaglio è sempre quello stabile delle scuole
+# secondarie di II grado, mai il campione della modalità ridotta: così la
+# stessa voce serve sia al campionamento sia alla pulizia, qualunque siano
+# NUM_SCUOLE e SEED_CAMPIONAMENTO, e il campione viene applicato blocco per
+# blocco durante la lettura.
+
+try:
+    import pyarrow  # noqa: F401
+    FORMATO_CACHE = 'feather'
+except ImportError:
+    FORMATO_CACHE = 'pkl'
+
+VERSIONE_CACHE = 3  # Da incrementare se cambia il modo in cui leggo i file
+_lock_cache = threading.Lock()
+_voci_in_lettura = set()  # Voci che completa_cache non deve eliminare
+
+
+def aggiorna_indice_sorgenti(nome, valori=None):
+    """
+    Leggo (e se richiesto aggiorno) l'indice dei file sorgente della cache.
+
+    L'indice registra per ogni file MIUR dimensione, data di modifica,
+    SHA-256 e righe di dati. Le letture avvengono da più thread, quindi
+    l'accesso è protetto da un lock e la scrittura è atomica.
+
+    Args:
+        nome (str): Nome del file sorgente
+        valori (dict): Valori da registrare (None = sola lettura)
+
+    Returns:
+        dict: Voce dell'indice per il file (vuota se assente)
+    """
+    path_indice = os.path.join(CACHE_MIUR_DIR, 'sorgenti.json')
+    with _lock_cache:
+        try:
+            with open(path_indice, encoding='utf-8') as f:
+                indice = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            indice = {}
+
+        if valori is not None:
+            indice[nome] = dict(indice.get(nome, {}), **valori)
+            os.makedirs(CACHE_MIUR_DIR, exist_ok=True)
+            temporaneo = path_indice + '.tmp'
+            with open(temporaneo, 'w', encoding='utf-8') as f:
+                json.dump(indice, f, indent=2)
+            os.replace(temporaneo, path_indice)
+    return indice.get(nome, {})
+
+
+def impronta_sorgente(path):
+    """
+    Calcolo l'impronta di un file MIUR.
+
+    Se dimensione e data di modifica coincidono con quelle registrate
+    nell'indice della cache riuso l'impronta, senza rileggere il file.
+
+    Args:
+        path (str): Percorso del file CSV
+
+    Returns:
+        dict: Dimensione, data di modifica, SHA-256 e (se note) righe di dati del file
+    """
+    stat = os.stat(path)
+    nome = os.path.basename(path)
+    voce = aggiorna_indice_sorgenti(nome)
+    if voce.get('size') == stat.st_size and voce.get('mtime_ns') == stat.st_mtime_ns:
+        return voce
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for blocco in iter(lambda: f.read(1 << 20), b''):
+            h.update(blocco)
+
+    # Se il contenuto è cambiato le righe verranno contate dalla prossima lettura
+    righe = voce.get('righe') if voce.get('sha256') == h.hexdigest() else None
+    return aggiorna_indice_sorgenti(nome, {
+        'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': h.hexdigest(), 'righe': righe
+    })
+
+
+def path_cache(path, usecols, chiave_filtro):
+    """
+    Costruisco il percorso della voce di cache per una lettura di un file MIUR.
+
+    Args:
+        path (str): Percorso del file CSV
+        usecols (list): Colonne lette
+        chiave_filtro (str): Descrizione univoca del filtro applicato
+
+    Returns:
+        Tuple[str, dict]: Percorso della voce (una directory) e impronta del file sorgente
+    """
+    sorgente = impronta_sorgente(path)
+    chiave = json.dumps([VERSIONE_CACHE, FORMATO_CACHE, sorgente['sha256'], usecols, chiave_filtro])
+    nome = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha256(chiave.encode()).hexdigest()[:24]
+    return os.path.join(CACHE_MIUR_DIR, f'{nome}__{digest}'), sorgente
+
+
+def leggi_cache(path_voce):
+    """
+    Leggo una voce di cache una parte alla volta, segnandola come usata di recente.
+
+    Mentre la leggo la voce non può essere eliminata per liberare spazio. Se
+    una parte è illeggibile elimino la voce, così l'esecuzione successiva la
+    ricostruisce dal file originale.
+
+    Args:
+        path_voce (str): Percorso della voce
+
+    Yields:
+        pd.DataFrame: Parti della voce, nell'ordine del file originale
+    """
+    with _lock_cache:
+        _voci_in_lettura.add(path_voce)
+    try:
+        os.utime(path_voce)
+        for nome in sorted(os.listdir(path_voce)):
+            parte = os.path.join(path_voce, nome)
+            try:
+                df = pd.read_feather(parte) if FORMATO_CACHE == 'feather' else pd.read_pickle(parte)
+            except Exception:
+                shutil.rmtree(path_voce, ignore_errors=True)
+                raise
+            yield df
+    finally:
+        with _lock_cache:
+            _voci_in_lettura.discard(path_voce)
+
+
+def scrivi_parte_cache(cartella, indice, df):
+    """
+    Salvo una parte di una voce di cache in costruzione.
+
+    Args:
+        cartella (str): Directory temporanea della voce
+        indice (int): Posizione della parte nel file originale
+        df (pd.DataFrame): Righe della parte
+    """
+    parte = os.path.join(cartella, f'parte_{indice:06d}.{FORMATO_CACHE}')
+    if FORMATO_CACHE == 'feather':
+        df.reset_index(drop=True).to_feather(parte)
+    else:
+        df.to_pickle(parte)
+
+
+def dimensione_voce(path_voce):
+    """
+    Calcolo lo spazio occupato da una voce di cache.
+
+    Args:
+        path_voce (str): Percorso della voce (directory o, per le versioni precedenti, file)
+
+    Returns:
+        int: Dimensione in byte
+    """
+    if not os.path.isdir(path_voce):
+        return os.path.getsize(path_voce)
+    return sum(os.path.getsize(os.path.join(path_voce, nome)) for nome in os.listdir(path_voce))
+
+
+def elimina_voce(path_voce):
+    """
+    Elimino una voce di cache (directory o, per le versioni precedenti, file).
+
+    Args:
+        path_voce (str): Percorso della voce
+    """
+    if os.path.isdir(path_voce):
+        shutil.rmtree(path_voce, ignore_errors=True)
+    else:
+        os.remove(path_voce)
+
+
+def completa_cache(cartella, path_voce):
+    """
+    Rendo definitiva una voce di cache ed elimino quelle superate.
+
+    Le voci dello stesso file sorgente con chiave diversa sono obsolete
+    (file cambiato, colonne o filtro diversi) e vengono eliminate; poi, se la
+    cache supera CACHE_MIUR_MAX_MB, elimino le voci usate meno di recente,
+    tranne quelle in lettura.
+
+    Args:
+        cartella (str): Directory temporanea con tutte le parti della voce
+        path_voce (str): Percorso definitivo della voce
+    """
+    with _lock_cache:
+        # Se un altro thread ha già completato la stessa voce tengo la sua
+        if os.path.isdir(path_voce):
+            shutil.rmtree(cartella, ignore_errors=True)
+        else:
+            os.replace(cartella, path_voce)
+
+        prefisso = os.path.basename(path_voce).split('__')[0] + '__'
+        voci = []
+        for nome in os.listdir(CACHE_MIUR_DIR):
+            completo = os.path.join(CACHE_MIUR_DIR, nome)
+            if '__' not in nome or nome.endswith('.tmp') or completo == path_voce:
+                continue
+            if nome.startswith(prefisso):
+                elimina_voce(completo)
+            elif completo not in _voci_in_lettura:
+                voci.append(completo)
+
+        # Rispetto il limite di dimensione partendo dalle voci meno usate
+        voci.sort(key=os.path.getmtime)
+        totale = dimensione_voce(path_voce) + sum(dimensione_voce(v) for v in voci)
+        while voci and totale > CACHE_MIUR_MAX_MB * 1024 * 1024:
+            vecchia = voci.pop(0)
+            totale -= dimensione_voce(vecchia)
+            elimina_voce(vecchia)
+
+
+# ============================================================================
+# LETTURA DEI FILE ORIGINALI
+# ============================================================================
+def blocchi_filtrati(path, filtro, chiave_filtro=None, righe_per_blocco=RIGHE_PER_BLOCCO_LETTURA,
+                     drop_cols=None, conteggio=None):
+    """
+    Leggo un file MIUR a blocchi, restituendo di ogni blocco le righe che soddisfano un filtro.
+
+    Di ogni blocco normalizzo prima le sole colonne chiave usate dal filtro,
+    poi tutte le colonne delle righe sopravvissute. Tengo in memoria un
+    blocco alla volta: la memoria di picco non dipende dalla dimensione del
+    file. Le colonne escluse dalla proiezione (vedi proiezione_colonne) non
+    vengono mai analizzate.
+
+    Con la cache attiva ogni blocco filtrato diventa una parte della voce di
+    cache; se il file non è cambiato rileggo direttamente le parti.
+
+    Args:
+        path (str): Percorso del file CSV
+        filtro: Funzione che riceve un blocco e restituisce la maschera delle righe da tenere
+        chiave_filtro (str): Descrizione univoca del filtro, usata come chiave
+            della cache (None = nessuna cache)
+        righe_per_blocco (int): Righe per blocco (None = file intero)
+        drop_cols (list): Colonne da non leggere (None = solo le colonne richieste)
+        conteggio (dict): Se indicato, a lettura completata vi registro in
+            'righe' le righe lette in totale dal file originale
+
+    Yields:
+        pd.DataFrame: Righe tenute di ogni blocco, con i valori normalizzati
+            (almeno un blocco, vuoto se nessuna riga supera il filtro)
+    """
+    usecols = proiezione_colonne(path, drop_cols)
+    if conteggio is None:
+        conteggio = {}
+
+    cartella = None
+    if USA_CACHE_MIUR and chiave_filtro is not None:
+        path_voce, sorgente = path_cache(path, usecols, chiave_filtro)
+        if sorgente.get('righe') is not None and os.path.isdir(path_voce):
+            yield from leggi_cache(path_voce)
+            conteggio['righe'] = sorgente['righe']
+            return
+
+        # Costruisco la voce in una directory temporanea mentre leggo il CSV
+        cartella = f'{path_voce}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.rmtree(cartella, ignore_errors=True)
+        os.makedirs(cartella)
+
+    try:
+        if righe_per_blocco is None:
+            blocchi = [pd.read_csv(path, dtype=str, usecols=usecols)]
+        else:
+            blocchi = pd.read_csv(path, dtype=str, usecols=usecols, chunksize=righe_per_blocco)
+
+        righe_lette = 0
+        parti = 0
+        for blocco in blocchi:
+            righe_lette += len(blocco)
+            blocco = blocco[filtro(blocco).to_numpy()].reset_index(drop=True)
+            if len(blocco) == 0:
+                continue
+            blocco = clean_string_columns(blocco)
+            if cartella is not None:
+                scrivi_parte_cache(cartella, parti, blocco)
+            parti += 1
+            yield blocco
+
+        if parti == 0:
+            vuoto = clean_string_columns(pd.read_csv(path, dtype=str, usecols=usecols, nrows=0))
+            if cartella is not None:
+                scrivi_parte_cache(cartella, 0, vuoto)
+            yield vuoto
+
+        if cartella is not None:
+            completa_cache(cartella, path_voce)
+            aggiorna_indice_sorgenti(os.path.basename(path), {'righe': righe_lette})
+        conteggio['righe'] = righe_lette
+    finally:
+        # Lettura interrotta: scarto la voce incompleta
+        if cartella is not None:
+            shutil.rmtree(cartella, ignore_errors=True)
+
+
+def leggi_filtrato(path, filtro, chiave_filtro=None, righe_per_blocco=RIGHE_PER_BLOCCO_LETTURA,
+                   drop_cols=None, tieni=None):
+    """
+    Leggo in un'unica tabella le righe di un file MIUR che soddisfano un filtro.
+
+    Il filtro aggiuntivo tieni è applicato a ogni blocco dopo la cache (vedi
+    blocchi_filtrati): in memoria si accumulano solo le righe che superano
+    entrambi i filtri.
+
+    Args:
+        path (str): Percorso del file CSV
+        filtro: Funzione che riceve un blocco e restituisce la maschera delle righe da tenere
+        chiave_filtro (str): Descrizione univoca del filtro, usata come chiave
+            della cache (None = nessuna cache)
+        righe_per_blocco (int): Righe per blocco (None = file intero)
+        drop_cols (list): Colonne da non leggere (None = solo le colonne richieste)
+        tieni: Filtro applicato ai blocchi già normalizzati, escluso dalla
+            cache (None = nessuno)
+
+    Returns:
+        Tuple[pd.DataFrame, int]: Righe tenute, con i valori normalizzati, e
+            numero di righe lette in totale dal file originale
+    """
+    conteggio = {}
+    blocchi = []
+    for blocco in blocchi_filtrati(path, filtro, chiave_filtro, righe_per_blocco, drop_cols, conteggio):
+        if tieni is not None:
+            blocco = blocco[tieni(blocco).to_numpy()]
+        blocchi.append(blocco)
+
+    # Scarto i blocchi vuoti, tenendone uno solo se lo sono tutti (per le colonne)
+    blocchi = [b for b in blocchi if len(b)] or blocchi[:1]
+    return pd.concat(blocchi, ignore_index=True), conteggio['righe']
+
+
 def sort_dataframe(df):
     """
     Ordino il DataFrame secondo una gerarchia geografica standard.
 
     L'ordinamento facilita la lettura manuale dei dati e garantisce
-    risultati deterministici tra esecuzioni diverse.
+    risultati deterministici tra esecuzioni diverse. Ordino sui codici
+    interi di ogni chiave, che seguono l'ordine alfabetico: per le colonne
+    categoriche sono quelli delle categorie, per le altre li ricavo con
+    factorize. L'ordinamento è stabile: a pari chiave le righe restano
+    nell'ordine di partenza, indipendentemente dalla versione di pandas.
 
     Args:
         df (pd.DataFrame): DataFrame da ordinare
@@ -132,209 +653,435 @@ def sort_dataframe(df):
     ]
     # Uso solo le colonne effettivamente presenti nel DataFrame
     valid_cols = [col for col in sort_cols if col in df.columns]
-    return df.sort_values(by=valid_cols)
+    if not valid_cols or len(df) == 0:
+        return df
+
+    # Codici interi di ogni chiave, con i mancanti (-1) in coda
+    chiavi = []
+    for col in valid_cols:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            codici = df[col].cat.codes.to_numpy().astype(np.int64)
+        else:
+            codici = pd.factorize(df[col], sort=True)[0].astype(np.int64)
+        chiavi.append(np.where(codici >= 0, codici, np.iinfo(np.int64).max))
+
+    # lexsort è stabile e usa come chiave principale l'ultima della lista
+    return df.iloc[np.lexsort(chiavi[::-1])]
 
 
 # ============================================================================
-# FASE 1: IDENTIFICAZIONE SCUOLE SECONDARIE DI II GRADO
+# PULIZIA DELLE SINGOLE FONTI
 # ============================================================================
-"""
-Prima di tutto devo identificare quali sono le scuole secondarie di II grado.
-Questo mi serve per filtrare tutti gli altri dataset e lavorare solo con
-le scuole di nostro interesse.
-"""
+def filtro_secondarie(scuole_secondarie):
+    """
+    Creo il filtro di lettura che tiene solo le righe delle scuole secondarie di II grado.
 
-# Carico il file che contiene l'ordine di scuola
-df_ordini = pd.read_csv(PATH_STU_CORSO_CLASSE, dtype=str)
-df_ordini = clean_string_columns(df_ordini)
-df_ordini = snake_case_columns(df_ordini)
+    Args:
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado da tenere
 
-# Estraggo solo i codici delle scuole secondarie di II grado
-# Questo set mi servirà per filtrare tutti gli altri dataset
-scuole_secondarie = set(df_ordini[df_ordini['ordinescuola'] == 'SCUOLA SECONDARIA II GRADO']['codicescuola'])
+    Returns:
+        Tuple: Funzione che riceve un blocco e restituisce la maschera delle
+            righe da tenere, e chiave del filtro per la cache
+    """
+    def solo_secondarie(blocco):
+        return colonna_chiave(blocco, 'CODICESCUOLA').isin(scuole_secondarie)
 
-# ============================================================================
-# FASE 2: PULIZIA ANAGRAFICA SCUOLE
-# ============================================================================
-"""
-L'anagrafica delle scuole contiene molte informazioni non necessarie per la
-simulazione. Rimuovo le colonne superflue e pulisco i dati essenziali.
-"""
+    codici = '\n'.join(sorted(scuole_secondarie)).encode()
+    return solo_secondarie, 'CODICESCUOLA:' + hashlib.sha256(codici).hexdigest()
 
-# Colonne da rimuovere perché non necessarie per la simulazione
-drop_cols_anag = [
-    'ANNOSCOLASTICO',  # Sempre uguale per tutti
-    'CAPSCUOLA',  # CAP non necessario
-    'INDIRIZZOSCUOLA',  # Indirizzo fisico non necessario
-    'INDICAZIONESEDEDIRETTIVO',  # Info amministrative non necessarie
-    'INDICAZIONESEDEOMNICOMPRENSIVO',
-    'INDIRIZZOEMAILSCUOLA',  # Contatti non necessari
-    'INDIRIZZOPECSCUOLA',
-    'SITOWEBSCUOLA',
-    'SEDESCOLASTICA'
-]
 
-# Carico e unisco i due file di anagrafica (normale e province autonome)
-anag1 = pd.read_csv(PATH_ANAG_SCUOLE, dtype=str)
-anag2 = pd.read_csv(PATH_ANAG_SCUOLE_PA, dtype=str)
-anag = pd.concat([anag1, anag2], ignore_index=True)
-original_len = len(anag)
+def leggi_sorgente(path, drop_cols, scuole_secondarie, scuole_da_pulire):
+    """
+    Leggo le righe di un file MIUR relative alle scuole da pulire.
 
-# Applico la pulizia
-anag.drop(columns=[c for c in drop_cols_anag if c in anag.columns], inplace=True)
-anag = clean_string_columns(anag)
-anag.drop_duplicates(subset=['CODICESCUOLA'], inplace=True)
+    Con la cache attiva leggo (dalla cache, se possibile) le scuole
+    secondarie di II grado e applico il campione a ogni blocco: la voce di
+    cache non dipende dal campione. Senza cache filtro direttamente in
+    lettura le scuole da pulire. In entrambi i casi in memoria si accumulano
+    solo le righe delle scuole da pulire.
 
-# Rimuovo record con dati essenziali mancanti
-anag.dropna(subset=['CODICESCUOLA', 'DENOMINAZIONESCUOLA', 'REGIONE', 'DESCRIZIONECOMUNE'], inplace=True)
+    Args:
+        path (str): Percorso del file CSV
+        drop_cols (list): Colonne da non leggere
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+        scuole_da_pulire (set): Codici da tenere (il campione in modalità ridotta)
 
-# Standardizzo i nomi delle colonne
-anag = snake_case_columns(anag)
+    Returns:
+        Tuple[pd.DataFrame, int]: Righe tenute e righe lette dal file originale
+    """
+    if not USA_CACHE_MIUR:
+        solo_da_pulire, _ = filtro_secondarie(scuole_da_pulire)
+        return leggi_filtrato(path, solo_da_pulire, drop_cols=drop_cols)
 
-# Filtro solo le scuole secondarie di II grado
-anag = anag[anag['codicescuola'].isin(scuole_secondarie)]
-report_stats("Anagrafica Scuole", original_len, anag)
+    tieni = None
+    if scuole_da_pulire is not scuole_secondarie:
+        tieni, _ = filtro_secondarie(scuole_da_pulire)
+    return leggi_filtrato(path, *filtro_secondarie(scuole_secondarie), drop_cols=drop_cols, tieni=tieni)
 
-# ============================================================================
-# FASE 3: PULIZIA DATI CITTADINANZA STUDENTI
-# ============================================================================
-"""
-Questo dataset contiene informazioni sulla cittadinanza degli studenti.
-È importante per generare una distribuzione realistica di studenti italiani
-e stranieri nelle classi simulate.
-"""
 
-drop_cols_cittad = ['ANNOSCOLASTICO', 'ORDINESCUOLA']  # Già filtrati altrove
-stu_cittad = pd.read_csv(PATH_STU_CITTAD, dtype=str)
-original_len = len(stu_cittad)
+def pulisci_anagrafica(scuole_secondarie, scuole_da_pulire):
+    """
+    Pulisco l'anagrafica delle scuole (FASE 3).
+
+    L'anagrafica delle scuole contiene molte informazioni non necessarie per la
+    simulazione. Rimuovo le colonne superflue e pulisco i dati essenziali.
+
+    Args:
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+        scuole_da_pulire (set): Codici da tenere (il campione in modalità ridotta)
 
-# Normalizzo i nomi delle colonne prima di rimuoverle
-stu_cittad.columns = [normalize_string(col) for col in stu_cittad.columns]
-stu_cittad.drop(columns=[normalize_string(c) for c in drop_cols_cittad if normalize_string(c) in stu_cittad.columns],
-                inplace=True)
+    Returns:
+        Tuple[pd.DataFrame, int]: Anagrafica pulita e righe lette dai file originali
+    """
+    # Carico e unisco i due file di anagrafica (normale e province autonome),
+    # tenendo solo le scuole da pulire e senza leggere le colonne di drop_cols_anag
+    anag1, len1 = leggi_sorgente(PATH_ANAG_SCUOLE, drop_cols_anag, scuole_secondarie, scuole_da_pulire)
+    anag2, len2 = leggi_sorgente(PATH_ANAG_SCUOLE_PA, drop_cols_anag, scuole_secondarie, scuole_da_pulire)
+    anag = pd.concat([anag1, anag2], ignore_index=True)
 
-# Pulizia standard
-stu_cittad = clean_string_columns(stu_cittad)
-stu_cittad.drop_duplicates(inplace=True)
+    # Applico la pulizia
+    anag = clean_string_columns(anag, categoriche=True)
+    anag.drop_duplicates(subset=['CODICESCUOLA'], inplace=True)
 
-# Rimuovo record con dati essenziali mancanti
-stu_cittad.dropna(subset=[
-    'CODICESCUOLA', 'ALUNNI', 'ALUNNICITTADINANZAITALIANA', 'ALUNNICITTADINANZANONITALIANA'
-], inplace=True)
+    # Rimuovo record con dati essenziali mancanti
+    anag.dropna(subset=['CODICESCUOLA', 'DENOMINAZIONESCUOLA', 'REGIONE', 'DESCRIZIONECOMUNE'], inplace=True)
 
-stu_cittad = snake_case_columns(stu_cittad)
+    # Standardizzo i nomi delle colonne
+    return snake_case_columns(anag), len1 + len2
 
-# Filtro solo le scuole secondarie
-stu_cittad = stu_cittad[stu_cittad['codicescuola'].isin(scuole_secondarie)]
-report_stats("Studenti Cittadinanza", original_len, stu_cittad)
 
-# ============================================================================
-# FASE 4: PULIZIA DATI STUDENTI PER INDIRIZZO
-# ============================================================================
-"""
-Questo dataset contiene il numero di studenti per indirizzo di studio,
-divisi per genere. È fondamentale per ricreare la struttura delle classi.
-"""
+def pulisci_cittadinanza(scuole_secondarie, scuole_da_pulire):
+    """
+    Pulisco i dati sulla cittadinanza degli studenti (FASE 4).
 
-drop_cols_ind = ['ANNOSCOLASTICO', 'ORDINESCUOLA']
-stu_ind = pd.read_csv(PATH_STU_INDIRIZZO, dtype=str)
-original_len = len(stu_ind)
+    Questo dataset è importante per generare una distribuzione realistica
+    di studenti italiani e stranieri nelle classi simulate.
+
+    Args:
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+        scuole_da_pulire (set): Codici da tenere (il campione in modalità ridotta)
 
-# Normalizzo i nomi delle colonne
-stu_ind.columns = [normalize_string(col) for col in stu_ind.columns]
-stu_ind.drop(columns=[normalize_string(c) for c in drop_cols_ind if normalize_string(c) in stu_ind.columns],
-             inplace=True)
+    Returns:
+        Tuple[pd.DataFrame, int]: Dati puliti e righe lette dal file originale
+    """
+    stu_cittad, original_len = leggi_sorgente(PATH_STU_CITTAD, drop_cols_cittad, scuole_secondarie, scuole_da_pulire)
 
-# Pulizia standard
-stu_ind = clean_string_columns(stu_ind)
-stu_ind = snake_case_columns(stu_ind)
+    # Normalizzo i nomi delle colonne
+    stu_cittad.columns = [normalize_string(col) for col in stu_cittad.columns]
 
-# Rimuovo record con dati essenziali mancanti
-stu_ind.dropna(subset=[
-    'codicescuola', 'tipopercorso', 'indirizzo', 'alunnimaschi', 'alunnifemmine'
-], inplace=True)
-stu_ind.drop_duplicates(inplace=True)
+    # Pulizia standard
+    stu_cittad = clean_string_columns(stu_cittad, categoriche=True)
+    stu_cittad.drop_duplicates(inplace=True)
 
-# Filtro solo le scuole secondarie
-stu_ind = stu_ind[stu_ind['codicescuola'].isin(scuole_secondarie)]
-report_stats("Studenti per Indirizzo", original_len, stu_ind)
+    # Rimuovo record con dati essenziali mancanti
+    stu_cittad.dropna(subset=[
+        'CODICESCUOLA', 'ALUNNI', 'ALUNNICITTADINANZAITALIANA', 'ALUNNICITTADINANZANONITALIANA'
+    ], inplace=True)
 
-# ============================================================================
-# FASE 5: CAMPIONAMENTO STRATIFICATO (MODALITÀ RIDOTTA)
-# ============================================================================
-"""
-In modalità ridotta, seleziono un campione rappresentativo di scuole
-mantenendo la diversità geografica e di tipologia di percorso.
-"""
+    return snake_case_columns(stu_cittad), original_len
 
-if ModalitaRidotta:
-    # Creo un dataset con metadati per il campionamento stratificato
-    meta_scuole = pd.merge(anag, stu_ind[['codicescuola', 'tipopercorso']], on='codicescuola', how='inner')
-    meta_scuole = meta_scuole.drop_duplicates(subset=['codicescuola', 'tipopercorso'])
-
-    # Raggruppo per regione e tipo di percorso per garantire rappresentatività
-    gruppi = meta_scuole.groupby(['regione', 'tipopercorso'])
-    scuole_per_gruppo = max(1, NUM_SCUOLE // len(gruppi))
-
-    # Campiono da ogni gruppo proporzionalmente
-    campione = pd.concat(
-        [g.sample(n=min(scuole_per_gruppo, len(g)), random_state=42) for _, g in gruppi],
-        ignore_index=True
-    )
-
-    # Se non ho raggiunto il numero target, aggiungo scuole extra
-    scuole_attuali = set(campione['codicescuola'])
-    if len(scuole_attuali) < NUM_SCUOLE:
-        disponibili = set(meta_scuole['codicescuola']) - scuole_attuali
-        extra = meta_scuole[meta_scuole['codicescuola'].isin(disponibili)].sample(
-            n=NUM_SCUOLE - len(scuole_attuali), random_state=42
-        )
-        campione = pd.concat([campione, extra], ignore_index=True)
 
-    # Filtro tutti i dataset con solo le scuole campionate
-    scuole_finali = set(campione['codicescuola'])
-    anag = anag[anag['codicescuola'].isin(scuole_finali)]
-    stu_cittad = stu_cittad[stu_cittad['codicescuola'].isin(scuole_finali)]
-    stu_ind = stu_ind[stu_ind['codicescuola'].isin(scuole_finali)]
+def pulisci_indirizzi(scuole_secondarie, scuole_da_pulire):
+    """
+    Pulisco i dati degli studenti per indirizzo (FASE 5).
+
+    Questo dataset contiene il numero di studenti per indirizzo di studio,
+    divisi per genere. È fondamentale per ricreare la struttura delle classi.
+
+    Args:
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+        scuole_da_pulire (set): Codici da tenere (il campione in modalità ridotta)
+
+    Returns:
+        Tuple[pd.DataFrame, int]: Dati puliti e righe lette dal file originale
+    """
+    stu_ind, original_len = leggi_sorgente(PATH_STU_INDIRIZZO, drop_cols_ind, scuole_secondarie, scuole_da_pulire)
+
+    # Normalizzo i nomi delle colonne
+    stu_ind.columns = [normalize_string(col) for col in stu_ind.columns]
+
+    # Pulizia standard
+    stu_ind = clean_string_columns(stu_ind, categoriche=True)
+    stu_ind = snake_case_columns(stu_ind)
+
+    # Rimuovo record con dati essenziali mancanti
+    stu_ind.dropna(subset=[
+        'codicescuola', 'tipopercorso', 'indirizzo', 'alunnimaschi', 'alunnifemmine'
+    ], inplace=True)
+    stu_ind.drop_duplicates(inplace=True)
+
+    return stu_ind, original_len
 
-    print(f"\n✅ Campione finale: {len(anag)} scuole (ridotto a {NUM_SCUOLE})")
 
 # ============================================================================
-# FASE 6: ORDINAMENTO E SALVATAGGIO
+# CAMPIONAMENTO STRATIFICATO
 # ============================================================================
-"""
-Ordino i dataset per facilitare la consultazione manuale e garantire
-risultati deterministici. Poi salvo tutto nella cartella di output.
-"""
+# Ogni scuola riceve una sola chiave casuale, ricavata dal codice scuola:
+# la chiave non dipende dall'ordine delle righe né dalle altre scuole presenti.
+# Dentro ogni gruppo (regione, tipo di percorso) le scuole vengono ordinate
+# per chiave; il campione prende prima le scuole di rango 0 di tutti i gruppi,
+# poi quelle di rango 1 e così via, fino al numero esatto richiesto.
+#
+# In modalità ridotta il campione viene scelto durante la lettura: per ogni
+# gruppo tengo solo le NUM_SCUOLE scuole con chiave minore (un serbatoio),
+# perché una scuola di rango maggiore non potrebbe comunque entrare nel
+# campione. Solo dopo leggo le righe di dettaglio delle scuole scelte.
+
+def chiavi_casuali(codici, seme=SEED_CAMPIONAMENTO):
+    """
+    Calcolo una chiave pseudo-casuale deterministica per ogni codice scuola.
+
+    Args:
+        codici (pd.Series): Codici delle scuole
+        seme (int): Seme del campionamento
+
+    Returns:
+        np.ndarray: Chiavi uint64, una per codice
+    """
+    return pd.util.hash_array(codici.astype(str).to_numpy(dtype=object), hash_key=f'{seme:016d}')
+
+
+def leggi_a_blocchi(path, drop_cols, scuole_secondarie, righe_per_blocco=RIGHE_PER_BLOCCO_LETTURA):
+    """
+    Leggo a blocchi le sole colonne richieste di un file MIUR, già normalizzate.
+
+    Tengo solo le righe delle scuole secondarie di II grado. Con la cache
+    attiva il file è letto, una parte alla volta, tramite la stessa voce di
+    cache usata dalla pulizia (colonne senza drop_cols), creandola se manca;
+    senza cache leggo dal CSV le sole colonne richieste.
+
+    Args:
+        path (str): Percorso del file CSV
+        drop_cols (list): Colonne escluse dalla lettura della pulizia
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+        righe_per_blocco (int): Righe per blocco (None = file intero)
+
+    Yields:
+        pd.DataFrame: Blocco con nomi e valori delle colonne normalizzati
+    """
+    usecols = proiezione_colonne(path)
+    solo_secondarie, chiave_filtro = filtro_secondarie(scuole_secondarie)
+    if USA_CACHE_MIUR:
+        blocchi = blocchi_filtrati(path, solo_secondarie, chiave_filtro, righe_per_blocco, drop_cols)
+    else:
+        blocchi = blocchi_filtrati(path, solo_secondarie, righe_per_blocco=righe_per_blocco)
+
+    for blocco in blocchi:
+        blocco = blocco[usecols].copy()
+        blocco.columns = [normalize_string(col) for col in blocco.columns]
+        yield blocco
+
+
+def regioni_scuole(scuole_secondarie):
+    """
+    Ricavo la regione di ogni scuola secondaria che supererà la pulizia dell'anagrafica.
+
+    Applico le stesse regole di pulisci_anagrafica (prima riga per codice,
+    scarto dei record senza dati essenziali), ma tengo una sola riga per
+    scuola: la memoria dipende dal numero di scuole, non di righe.
+
+    Args:
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+
+    Returns:
+        pd.Series: Regione indicizzata per codice scuola
+    """
+    parti = []
+    for path in (PATH_ANAG_SCUOLE, PATH_ANAG_SCUOLE_PA):
+        for blocco in leggi_a_blocchi(path, drop_cols_anag, scuole_secondarie):
+            blocco = blocco[blocco['CODICESCUOLA'].isin(scuole_secondarie)]
+            parti.append(blocco.drop_duplicates(subset=['CODICESCUOLA']))
+
+    anag = pd.concat(parti, ignore_index=True).drop_duplicates(subset=['CODICESCUOLA'])
+    anag = anag.dropna(subset=['CODICESCUOLA', 'DENOMINAZIONESCUOLA', 'REGIONE', 'DESCRIZIONECOMUNE'])
+    return anag.set_index('CODICESCUOLA')['REGIONE']
+
+
+def aggiorna_serbatoi(serbatoi, candidati, capienza):
+    """
+    Unisco nuove scuole ai serbatoi e tengo per ogni gruppo le capienza chiavi minori.
+
+    Args:
+        serbatoi (pd.DataFrame): Serbatoi attuali (None = vuoti)
+        candidati (pd.DataFrame): Colonne codicescuola, regione, tipopercorso, chiave
+        capienza (int): Scuole da tenere per ogni gruppo
+
+    Returns:
+        pd.DataFrame: Serbatoi aggiornati, con il rango di ogni scuola nel suo gruppo
+    """
+    meta = pd.concat([serbatoi, candidati], ignore_index=True) if serbatoi is not None else candidati
+    meta = meta.drop_duplicates(subset=['codicescuola', 'regione', 'tipopercorso'])
+
+    # Rango di ogni scuola all'interno del proprio gruppo
+    meta = meta.sort_values(['regione', 'tipopercorso', 'chiave', 'codicescuola'], kind='stable')
+    meta['rango'] = meta.groupby(['regione', 'tipopercorso'], sort=False).cumcount()
+    return meta[meta['rango'] < capienza]
+
+
+def scegli_dai_serbatoi(serbatoi, num_scuole):
+    """
+    Seleziono esattamente num_scuole scuole distinte dai serbatoi dei gruppi.
+
+    Una scuola presente in più gruppi (più tipi di percorso) conta una volta
+    sola e vale per il gruppo in cui ha il rango migliore.
+
+    Args:
+        serbatoi (pd.DataFrame): Serbatoi prodotti da aggiorna_serbatoi
+        num_scuole (int): Numero di scuole da selezionare
 
-# Applico l'ordinamento standard a tutti i dataset
-anag = sort_dataframe(anag)
-stu_cittad = sort_dataframe(stu_cittad)
-stu_ind = sort_dataframe(stu_ind)
+    Returns:
+        set: Codici delle scuole campionate (tutte, se sono meno di num_scuole)
+    """
+    if serbatoi is None:
+        return set()
+
+    # Ordino per (rango, chiave) e tengo la prima occorrenza di ogni scuola
+    meta = serbatoi.sort_values(['rango', 'chiave', 'codicescuola'], kind='stable')
+    meta = meta.drop_duplicates(subset='codicescuola')
+    return set(meta['codicescuola'].head(num_scuole))
+
+
+def campiona_in_lettura(scuole_secondarie, num_scuole, seme=SEED_CAMPIONAMENTO):
+    """
+    Scelgo il campione di scuole leggendo anagrafica e indirizzi.
+
+    Il risultato coincide con il campionamento sui dati già puliti: applico
+    ai blocchi le stesse regole di pulisci_indirizzi e tengo in memoria solo
+    le regioni delle scuole e i serbatoi dei gruppi. Con la cache attiva i
+    file arrivano dalle stesse voci di cache della pulizia (vedi
+    leggi_a_blocchi), altrimenti li leggo in streaming dal CSV.
+
+    Args:
+        scuole_secondarie (set): Codici delle scuole secondarie di II grado
+        num_scuole (int): Numero di scuole da selezionare
+        seme (int): Seme del campionamento
 
-# Creo la directory di output se non esiste
-out_dir = os.path.join(BASE_DIR, '../file/dataset_puliti')
-os.makedirs(out_dir, exist_ok=True)
+    Returns:
+        set: Codici delle scuole campionate
+    """
+    regioni = regioni_scuole(scuole_secondarie)
+
+    serbatoi = None
+    for blocco in leggi_a_blocchi(PATH_STU_INDIRIZZO, drop_cols_ind, scuole_secondarie):
+        blocco = blocco[blocco['CODICESCUOLA'].isin(scuole_secondarie)]
+        blocco = blocco.dropna(subset=['CODICESCUOLA', 'TIPOPERCORSO', 'INDIRIZZO', 'ALUNNIMASCHI', 'ALUNNIFEMMINE'])
+
+        candidati = pd.DataFrame({
+            'codicescuola': blocco['CODICESCUOLA'],
+            'tipopercorso': blocco['TIPOPERCORSO']
+        }).drop_duplicates()
+        candidati['regione'] = candidati['codicescuola'].map(regioni)
+        candidati = candidati.dropna()
+        candidati['chiave'] = chiavi_casuali(candidati['codicescuola'], seme)
+
+        serbatoi = aggiorna_serbatoi(serbatoi, candidati, num_scuole)
 
-# Salvo i file puliti
-anag.to_csv(os.path.join(out_dir, 'anagrafica_scuole_pulita.csv'), index=False)
-stu_cittad.to_csv(os.path.join(out_dir, 'stu_cittadinanza_pulito.csv'), index=False)
-stu_ind.to_csv(os.path.join(out_dir, 'stu_indirizzi_pulito.csv'), index=False)
+    return scegli_dai_serbatoi(serbatoi, num_scuole)
 
-print("\n✅ File ordinati e salvati nella cartella 'dataset_puliti'.")
 
 # ============================================================================
-# VERIFICA FINALE DI COERENZA
+# ESECUZIONE DELLA FASE
 # ============================================================================
-"""
-Verifico che tutti i codici scuola nei dataset di dettaglio siano presenti
-nell'anagrafica. Questo garantisce l'integrità referenziale.
-"""
+def esegui(contesto=None):
+    """
+    Pulisco i file MIUR originali e salvo i dataset puliti.
+
+    Args:
+        contesto (dict): Tabelle condivise tra le fasi eseguite nello stesso
+            processo (None quando lo script è eseguito da solo)
+
+    Returns:
+        dict: Il contesto aggiornato con anagrafica, cittadinanza e indirizzi puliti
+    """
+    # ========================================================================
+    # FASE 1: IDENTIFICAZIONE SCUOLE SECONDARIE DI II GRADO
+    # ========================================================================
+    # Prima di tutto devo identificare quali sono le scuole secondarie di II grado.
+    # Questo mi serve per filtrare tutti gli altri dataset e lavorare solo con
+    # le scuole di nostro interesse.
+
+    # Leggo a blocchi il file che contiene l'ordine di scuola tenendo solo le
+    # secondarie di II grado, e ne estraggo i codici scuola
+    # Questo set mi servirà per filtrare tutti gli altri dataset
+    scuole_secondarie = set()
+    for blocco in blocchi_filtrati(PATH_STU_CORSO_CLASSE,
+                                   lambda b: colonna_chiave(b, 'ORDINESCUOLA') == ORDINE_SCUOLA,
+                                   'ORDINESCUOLA:' + ORDINE_SCUOLA):
+        scuole_secondarie.update(colonna_chiave(blocco, 'CODICESCUOLA').dropna())
+
+    # ========================================================================
+    # FASE 2: CAMPIONAMENTO STRATIFICATO (MODALITÀ RIDOTTA)
+    # ========================================================================
+    # In modalità ridotta, seleziono un campione rappresentativo di scuole
+    # mantenendo la diversità geografica e di tipologia di percorso. Il
+    # campione viene scelto in lettura, così le fasi successive puliscono
+    # solo le righe delle scuole campionate; la cache resta indipendente dal
+    # campione, che viene applicato a ogni blocco letto dalla cache.
+
+    if ModalitaRidotta:
+        scuole_da_pulire = campiona_in_lettura(scuole_secondarie, NUM_SCUOLE)
+    else:
+        scuole_da_pulire = scuole_secondarie
+
+    # ========================================================================
+    # FASI 3-5: PULIZIA DELLE FONTI IN PARALLELO
+    # ========================================================================
+    # Le pulizie di anagrafica, cittadinanza e indirizzi sono indipendenti tra
+    # loro: le eseguo in contemporanea.
+    # Le statistiche di pulizia sono stampate dopo, sempre nello stesso ordine.
+
+    pulizie = [
+        ("Anagrafica Scuole", pulisci_anagrafica),
+        ("Studenti Cittadinanza", pulisci_cittadinanza),
+        ("Studenti per Indirizzo", pulisci_indirizzi)
+    ]
+    with ThreadPoolExecutor(max_workers=NUM_THREAD_PULIZIA) as executor:
+        futuri = [executor.submit(funzione, scuole_secondarie, scuole_da_pulire) for _, funzione in pulizie]
+        risultati = [f.result() for f in futuri]
+
+    for (nome, _), (df, original_len) in zip(pulizie, risultati):
+        report_stats(nome, original_len, df)
+    (anag, _), (stu_cittad, _), (stu_ind, _) = risultati
+
+    if ModalitaRidotta:
+        print(f"\n✅ Campione finale: {len(anag)} scuole (ridotto a {NUM_SCUOLE})")
+
+    # ========================================================================
+    # FASE 6: ORDINAMENTO E SALVATAGGIO
+    # ========================================================================
+    # Ordino i dataset per facilitare la consultazione manuale e garantire
+    # risultati deterministici. Poi salvo tutto nella cartella di output.
+
+    # Applico l'ordinamento standard a tutti i dataset e riporto le colonne
+    # categoriche a testo
+    anag = come_testo(sort_dataframe(anag))
+    stu_cittad = come_testo(sort_dataframe(stu_cittad))
+    stu_ind = come_testo(sort_dataframe(stu_ind))
+
+    # Creo la directory di output se non esiste
+    out_dir = os.path.join(BASE_DIR, '../file/dataset_puliti')
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Salvo i file puliti
+    salva_tabella(contesto, anag, os.path.join(out_dir, 'anagrafica_scuole_pulita.csv'))
+    salva_tabella(contesto, stu_cittad, os.path.join(out_dir, 'stu_cittadinanza_pulito.csv'))
+    salva_tabella(contesto, stu_ind, os.path.join(out_dir, 'stu_indirizzi_pulito.csv'))
+
+    print("\n✅ File ordinati e salvati nella cartella 'dataset_puliti'.")
+
+    # ========================================================================
+    # VERIFICA FINALE DI COERENZA
+    # ========================================================================
+    # Verifico che tutti i codici scuola nei dataset di dettaglio siano presenti
+    # nell'anagrafica. Questo garantisce l'integrità referenziale.
+
+    codici = set(anag['codicescuola'])
+    assert set(stu_cittad['codicescuola']).issubset(codici), "⚠️ stu_cittad contiene codici non coerenti"
+    assert set(stu_ind['codicescuola']).issubset(codici), "⚠️ stu_ind contiene codici non coerenti"
+    print("✅ Verifica finale: tutti i file sono coerenti.")
+
+    return contesto
 
-codici = set(anag['codicescuola'])
-assert set(stu_cittad['codicescuola']).issubset(codici), "⚠️ stu_cittad contiene codici non coerenti"
-assert set(stu_ind['codicescuola']).issubset(codici), "⚠️ stu_ind contiene codici non coerenti"
-print("✅ Verifica finale: tutti i file sono coerenti.")
 
 # ============================================================================
 # NOTE PER L'UTILIZZO
@@ -353,4 +1100,7 @@ Per modificare il comportamento di questo script:
 
 Il campionamento stratificato garantisce rappresentatività geografica
 e per tipo di percorso, fondamentale per analisi statistiche accurate.
-"""
\ No newline at end of file
+"""
+
+if __name__ == '__main__':
+    esegui()
@@ -0,0 +1,227 @@
+"""
+================================================================================
+SCHEMA DEI FILE DELLA PIPELINE
+================================================================================
+Dichiaro in un solo punto il tipo di ogni colonna dei file intermedi e finali
+della pipeline. Le fasi leggono i CSV attraverso questo modulo (direttamente
+con leggi_csv o tramite leggi_tabella del contesto, che applica lo stesso
+schema alle tabelle in memoria), così ogni colonna arriva già convertita:
+
+- le colonne testuali restano stringhe, con i valori mancanti ancora
+  mancanti (NaN) e non la stringa "nan";
+- i conteggi diventano interi compatti: valori mancanti o non numerici
+  diventano 0, come faceva la conversione cella per cella to_int_safe;
+- le misure (percentuali, indici) diventano float64, con NaN se mancanti.
+
+Autore: Antonio Di Giorgio
+Data: Giugno 2025
+================================================================================
+"""
+
+import os
+import importlib.util
+import pandas as pd
+
+# ============================================================================
+# CONFIGURAZIONE
+# ============================================================================
+# Motore di lettura dei CSV: pyarrow (multithread) se installato,
+# altrimenti il parser C di pandas
+MOTORE_CSV = 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+# Tipo delle colonne testuali
+TESTO = 'str'
+
+# Tipi delle colonne di ogni file, indicizzati per nome del file
+SCHEMI = {
+    # --- dataset_puliti: prodotti da pulizia_mim.py ---
+    'anagrafica_scuole_pulita.csv': {
+        'areageografica': TESTO,
+        'regione': TESTO,
+        'provincia': TESTO,
+        'codiceistitutoriferimento': TESTO,
+        'denominazioneistitutoriferimento': TESTO,
+        'codicescuola': TESTO,
+        'denominazionescuola': TESTO,
+        'codicecomunescuola': TESTO,
+        'descrizionecomune': TESTO,
+        'descrizionecaratteristicascuola': TESTO,
+        'descrizionetipologiagradoistruzionescuola': TESTO
+    },
+    'stu_cittadinanza_pulito.csv': {
+        'codicescuola': TESTO,
+        'annocorso': 'int8',
+        'alunni': 'int32',
+        'alunnicittadinanzaitaliana': 'int32',
+        'alunnicittadinanzanonitaliana': 'int32'
+    },
+    'stu_indirizzi_pulito.csv': {
+        'codicescuola': TESTO,
+        'tipopercorso': TESTO,
+        'indirizzo': TESTO,
+        'annocorso': 'int8',
+        'alunnimaschi': 'int32',
+        'alunnifemmine': 'int32'
+    },
+
+    # --- statistiche_base: prodotto da calcolo_statistiche.py ---
+    # I conteggi mancanti (scuole senza dati di cittadinanza o di indirizzo)
+    # diventano 0; le percentuali mancanti restano NaN
+    'statistiche_base.csv': {
+        'codicescuola': TESTO,
+        'regione': TESTO,
+        'provincia': TESTO,
+        'descrizionecomune': TESTO,
+        'alunni': 'int32',
+        'alunnicittadinanzaitaliana': 'int32',
+        'alunnicittadinanzanonitaliana': 'int32',
+        'num_indirizzi': 'int16',
+        'alunni_da_indirizzi': 'int32',
+        'perc_italiani': 'float64',
+        'perc_stranieri': 'float64',
+        'alunnimaschi': 'int32',
+        'alunnifemmine': 'int32',
+        'totale': 'int32',
+        'perc_maschi': 'float64',
+        'perc_femmine': 'float64',
+        'tipopercorso': TESTO,
+        'reg_num_scuole': 'int32',
+        'reg_num_indirizzi': 'int16',
+        'reg_tot_studenti': 'int32',
+        'reg_media_studenti_per_scuola': 'float64'
+    },
+
+    # --- dataset_definitivi: prodotti da genera_dati_simulati.py ---
+    'classi.csv': {
+        'id_classe': TESTO,
+        'codicescuola': TESTO,
+        'indirizzo': TESTO,
+        'indirizzo_norm': TESTO,
+        'annocorso': 'int8',
+        'nome_classe': TESTO,
+        'num_studenti': 'int16',
+        'num_maschi': 'int16',
+        'num_femmine': 'int16',
+        'num_italiani': 'int16',
+        'num_stranieri': 'int16',
+        'num_stranieri_ue': 'int16',
+        'num_stranieri_non_ue': 'int16',
+        'provincia': TESTO,
+        'area_geografica': TESTO
+    },
+    'studenti.csv': {
+        'id_studente': TESTO,
+        'id_classe': TESTO,
+        'nome': TESTO,
+        'cognome': TESTO,
+        'sesso': TESTO,
+        'cittadinanza': TESTO,
+        'escs': 'float64',
+        'escs_quartile': 'int8'
+    },
+    'docenti.csv': {
+        'id_docente': TESTO,
+        'nome': TESTO,
+        'cognome': TESTO,
+        'materia': TESTO
+    },
+    'assegnazioni_docenti.csv': {
+        'id_docente': TESTO,
+        'id_classe': TESTO,
+        'materia': TESTO
+    },
+    'voti.csv': {
+        'id_voto': TESTO,
+        'id_studente': TESTO,
+        'id_docente': TESTO,
+        'materia': TESTO,
+        'voto': 'int8',
+        'tipologia': TESTO,
+        'data': TESTO
+    }
+}
+
+
+# ============================================================================
+# CONVERSIONE DEI TIPI
+# ============================================================================
+def schema_file(path):
+    """
+    Restituisco lo schema di un file della pipeline.
+
+    Args:
+        path (str): Percorso del file CSV
+
+    Returns:
+        dict: Tipo di ogni colonna, o None se il file non ha uno schema
+    """
+    return SCHEMI.get(os.path.basename(path))
+
+
+def converti_colonna(serie, tipo):
+    """
+    Converto una colonna nel tipo dichiarato dallo schema, in modo vettoriale.
+
+    Args:
+        serie (pd.Series): Colonna letta dal CSV o presa dal contesto
+        tipo (str): Tipo dichiarato nello schema
+
+    Returns:
+        pd.Series: Colonna convertita
+    """
+    if tipo == TESTO:
+        # Su pandas 2 astype(str) trasforma i mancanti nella stringa "nan":
+        # li riporto a NaN (su pandas 3 il tipo str li conserva già)
+        return serie.astype(TESTO).where(serie.notna())
+
+    # Il parser riconosce già le colonne interamente numeriche: converto
+    # con to_numeric solo quelle rimaste testuali
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = pd.to_numeric(serie, errors='coerce')
+    if pd.api.types.is_integer_dtype(tipo):
+        serie = serie.fillna(0)
+    return serie.astype(tipo)
+
+
+def applica_schema(df, schema):
+    """
+    Converto le colonne di un DataFrame nei tipi dichiarati dallo schema.
+
+    Le colonne non presenti nello schema restano invariate.
+
+    Args:
+        df (pd.DataFrame): Tabella da convertire (non viene modificata)
+        schema (dict): Tipo di ogni colonna
+
+    Returns:
+        pd.DataFrame: Tabella con le colonne convertite
+    """
+    return df.assign(**{col: converti_colonna(df[col], tipo)
+                        for col, tipo in schema.items() if col in df.columns})
+
+
+def leggi_csv(path, usecols=None):
+    """
+    Leggo un file della pipeline applicando il suo schema.
+
+    Le colonne testuali sono lette direttamente come stringhe; quelle
+    numeriche sono lasciate al parser e poi convertite nel tipo compatto.
+    Solo i campi vuoti (come li scrive to_csv) sono valori mancanti: sigle
+    come 'NA' (Napoli) restano testo, come nelle tabelle in memoria.
+
+    Args:
+        path (str): Percorso del file CSV
+        usecols (list): Colonne da leggere (None = tutte)
+
+    Returns:
+        pd.DataFrame: Tabella con i tipi dello schema
+    """
+    schema = schema_file(path)
+    if schema is None:
+        return pd.read_csv(path, usecols=usecols, engine=MOTORE_CSV)
+
+    dtype = {col: TESTO for col, tipo in schema.items()
+             if tipo == TESTO and (usecols is None or col in usecols)}
+    df = pd.read_csv(path, usecols=usecols, dtype=dtype, keep_default_na=False,
+                     na_values=[''], engine=MOTORE_CSV)
+    return applica_schema(df, schema)